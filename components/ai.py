@@ -10,6 +10,7 @@ import tcod
 
 
 from scripts.actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+import scripts.profiling as profiling
 
 
 if TYPE_CHECKING:
@@ -18,10 +19,12 @@ if TYPE_CHECKING:
 
 
 class BaseAI(Action):
+    __slots__ = ()
 
     def perform(self) -> None:
         raise NotImplementedError
     
+    @profiling.traced("pathfinding")
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """
         Compute and return a path to the target position.
@@ -54,6 +57,8 @@ class BaseAI(Action):
     
 
 class HostileEnemy(BaseAI):
+    __slots__ = ("path",)
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
@@ -85,6 +90,8 @@ class ConfusedEnemy(BaseAI):
     If an actor occupies a tile it is randomly moving into, it will attack.
     """
 
+    __slots__ = ("previous_ai", "turns_remaining")
+
     def __init__(
         self, entity: Actor, previous_ai: Optional[BaseAI], turns_remaining: int
     ):
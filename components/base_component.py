@@ -2,13 +2,17 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from scripts.slots import Slotted
+
 if TYPE_CHECKING:
     from scripts.engine import Engine
     from scripts.entity import Entity
     from scripts.game_map import GameMap
 
 
-class BaseComponent:
+class BaseComponent(Slotted):
+    __slots__ = ("parent",)
+
     parent: Entity  # Owning entity instance.
 
     @property
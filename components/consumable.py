@@ -7,6 +7,7 @@ import scripts.color as color
 
 import components.ai
 import components.inventory
+import scripts.spatial as spatial
 from components.base_component import BaseComponent
 
 from scripts.exceptions import Impossible
@@ -22,6 +23,8 @@ if TYPE_CHECKING:
 
 
 class Consumable(BaseComponent):
+    __slots__ = ()
+
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
@@ -45,6 +48,8 @@ class Consumable(BaseComponent):
     
 
 class ConfusionConsumable(Consumable):
+    __slots__ = ("number_of_turns",)
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -80,6 +85,8 @@ class ConfusionConsumable(Consumable):
 
         
 class HealingConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
@@ -97,6 +104,8 @@ class HealingConsumable(Consumable):
         
 
 class FireballDamageConsumable(Consumable):
+    __slots__ = ("damage", "radius")
+
     def __init__(self, damage: int, radius: int):
         self.damage = damage
         self.radius = radius
@@ -118,13 +127,12 @@ class FireballDamageConsumable(Consumable):
             raise Impossible(self.engine.translation.translate("must_target_visible"))
         
         targets_hit = False
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    self.engine.translation.translate("fireball_message", target=actor.name, damage=self.damage)
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        for actor in spatial.actors_in_disk(self.engine.game_map, *target_xy, self.radius):
+            self.engine.message_log.add_message(
+                self.engine.translation.translate("fireball_message", target=actor.name, damage=self.damage)
+            )
+            actor.fighter.take_damage(self.damage)
+            targets_hit = True
 
         if not targets_hit:
             raise Impossible(self.engine.translation.translate("no_targets"))
@@ -132,22 +140,21 @@ class FireballDamageConsumable(Consumable):
 
 
 class LightningDamageConsumable(Consumable):
+    __slots__ = ("damage", "maximum_range")
+
     def __init__(self, damage: int, maximum_range: int) -> None:
         self.damage = damage
         self.maximum_range = maximum_range
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
-
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        target = spatial.nearest_visible_actor(
+            self.engine.game_map,
+            consumer.x,
+            consumer.y,
+            closer_than=self.maximum_range + 1.0,
+            exclude=consumer,
+        )
 
         if target:
             self.engine.message_log.add_message(
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, TYPE_CHECKING
+from typing import Any, Dict, Iterator, Optional, Tuple, TYPE_CHECKING
 
 from components.base_component import BaseComponent
 from scripts.equipment_types import EquipmentType
@@ -9,7 +9,18 @@ if TYPE_CHECKING:
     from scripts.entity import Actor, Item
 
 
+# The slot attribute of each equipment type. A new slot only needs an entry here
+# and an attribute in Equipment.__slots__, the bonus totals are cached either way.
+SLOTS: Dict[EquipmentType, str] = {
+    EquipmentType.WEAPON: "weapon",
+    EquipmentType.ARMOR: "armor",
+    EquipmentType.RING: "ring",
+}
+
+
 class Equipment(BaseComponent):
+    __slots__ = ("weapon", "armor", "ring", "_bonuses")
+
     parent: Actor
 
     def __init__(
@@ -21,39 +32,57 @@ class Equipment(BaseComponent):
         self.weapon = weapon
         self.armor = armor
         self.ring = ring
+        # (power, defense) of the equipped items, None when they need adding up again.
+        self._bonuses: Optional[Tuple[int, int]] = None
 
-    @property
-    def defense_bonus(self) -> int:
-        bonus = 0
+    def __setstate__(self, state: Any) -> None:
+        self._bonuses = None    # Saves from before the cache don't have it.
+        super().__setstate__(state)
 
-        if self.weapon is not None and self.weapon.equippable is not None:
-            bonus += self.weapon.equippable.defense_bonus
+    def copy(self, clones: Dict[Item, Item]) -> Equipment:
+        """Return a copy with the clones of the equipped items, see `Inventory.copy`."""
+        equipment = Equipment()
+        for slot in SLOTS.values():
+            item = getattr(self, slot)
+            setattr(equipment, slot, clones[item] if item is not None else None)
+        return equipment
 
-        if self.armor is not None and self.armor.equippable is not None:
-            bonus += self.armor.equippable.defense_bonus
+    @property
+    def items(self) -> Iterator[Item]:
+        """Iterate over the equipped items."""
+        for slot in SLOTS.values():
+            item = getattr(self, slot)
+            if item is not None:
+                yield item
+
+    def invalidate_bonuses(self) -> None:
+        self._bonuses = None
+
+    def slots_changed(self) -> None:
+        """Must be called after the equipped items change, to update the cached stats."""
+        self.invalidate_bonuses()
+        self.parent.fighter.invalidate_stats()
+        self.gamemap.actor_changed(self.parent)
+
+    def _add_bonuses(self) -> Tuple[int, int]:
+        power = defense = 0
+        for item in self.items:
+            if item.equippable is not None:
+                power += item.equippable.power_bonus
+                defense += item.equippable.defense_bonus
+        self._bonuses = (power, defense)
+        return self._bonuses
 
-        if self.ring is not None and self.ring.equippable is not None:
-            bonus += self.ring.equippable.defense_bonus
+    @property
+    def defense_bonus(self) -> int:
+        return (self._bonuses or self._add_bonuses())[1]
 
-        return bonus
-    
     @property
     def power_bonus(self) -> int:
-        bonus = 0
-
-        if self.weapon is not None and self.weapon.equippable is not None:
-            bonus += self.weapon.equippable.power_bonus
+        return (self._bonuses or self._add_bonuses())[0]
 
-        if self.armor is not None and self.armor.equippable is not None:
-            bonus += self.armor.equippable.power_bonus
-
-        if self.ring is not None and self.ring.equippable is not None:
-            bonus += self.ring.equippable.power_bonus
-
-        return bonus
-    
     def item_is_equipped(self, item: Item) -> bool:
-        return self.weapon == item or self.armor == item or self.ring == item
+        return any(equipped is item for equipped in self.items)
     
     def unequip_message(self, item_name: str) -> None:
         self.parent.gamemap.engine.message_log.add_message(
@@ -72,6 +101,7 @@ class Equipment(BaseComponent):
             self.unequip_from_slot(slot, add_message)
 
         setattr(self, slot, item)
+        self.slots_changed()
 
         if add_message:
             self.equip_message(item.name)
@@ -83,24 +113,14 @@ class Equipment(BaseComponent):
             self.unequip_message(current_item.name)
 
         setattr(self, slot, None)
+        self.slots_changed()
 
     def toggle_equip(
         self,
         equippable_item: Item,
         add_message: bool = True,
     ) -> None:
-        if (
-            equippable_item.equippable
-            and equippable_item.equippable.equipment_type in EquipmentType
-        ):
-            match equippable_item.equippable.equipment_type:
-                case EquipmentType.WEAPON:
-                    slot = "weapon"
-                case EquipmentType.ARMOR:
-                    slot = "armor"
-                case EquipmentType.RING:
-                    slot = "ring"
-        
+        slot = SLOTS[equippable_item.equippable.equipment_type]
 
         if getattr(self, slot) == equippable_item:
             self.unequip_from_slot(slot, add_message)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 
-from typing import TYPE_CHECKING
+from typing import Any, Optional, TYPE_CHECKING
 
 
 import scripts.color
@@ -14,6 +14,8 @@ if TYPE_CHECKING:
 
 
 class Fighter(BaseComponent):
+    __slots__ = ("max_hp", "_hp", "base_defense", "base_power", "_defense", "_power")
+
     parent: Actor
 
     def __init__(self, hp: int, base_defense: int, base_power: int):
@@ -21,6 +23,23 @@ class Fighter(BaseComponent):
         self._hp = hp
         self.base_defense = base_defense
         self.base_power = base_power
+        # Derived stats, cached until the base stats or the equipment change.
+        self._defense: Optional[int] = None
+        self._power: Optional[int] = None
+
+    def __setstate__(self, state: Any) -> None:
+        self.invalidate_stats()     # Saves from before the cache don't have it.
+        super().__setstate__(state)
+
+    def invalidate_stats(self) -> None:
+        """Must be called after the base stats or the equipment change."""
+        self._defense = None
+        self._power = None
+
+    def copy(self) -> Fighter:
+        fighter = Fighter(hp=self.max_hp, base_defense=self.base_defense, base_power=self.base_power)
+        fighter._hp = self._hp
+        return fighter
 
     @property
     def hp(self) -> int:
@@ -28,17 +47,23 @@ class Fighter(BaseComponent):
     
     @hp.setter
     def hp(self, value: int) -> None:
+        self.gamemap.entity_changing(self.parent)
         self._hp = max(0, min(value, self.max_hp))
+        self.gamemap.entity_changed(self.parent)
         if self._hp == 0 and self.parent.ai:
             self.die()
 
     @property
     def defense(self) -> int:
-        return self.base_defense + self.defense_bonus
+        if self._defense is None:
+            self._defense = self.base_defense + self.defense_bonus
+        return self._defense
     
     @property
     def power(self) -> int:
-        return self.base_power + self.power_bonus
+        if self._power is None:
+            self._power = self.base_power + self.power_bonus
+        return self._power
     
     @property
     def defense_bonus(self) -> int:
@@ -86,8 +111,13 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = self.engine.translation.translate("remains", entity=self.parent.name)
         self.parent.render_order = RenderOrder.CORPSE
+        self.gamemap.actor_changed(self.parent)
 
         self.engine.message_log.add_message(death_msg, death_msg_color)
 
         self.engine.player.level.add_xp(self.parent.level.xp_given)
+
+        if self.engine.player is not self.parent:
+            # The player's remains stay an entity, the game over screen still needs it.
+            self.gamemap.add_corpse(self.parent)
         
\ No newline at end of file
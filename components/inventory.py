@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, TYPE_CHECKING
 
 from components.base_component import BaseComponent
 
@@ -11,12 +11,23 @@ if TYPE_CHECKING:
 
 
 class Inventory(BaseComponent):
+    __slots__ = ("capacity", "items")
+
     parent: Actor
 
     def __init__(self, capacity: int):
         self.capacity = capacity
         self.items: List[Item] = []
 
+    def copy(self, clones: Dict[Item, Item]) -> Inventory:
+        """Return a copy holding clones of the items, `clones` maps each item to its clone."""
+        inventory = Inventory(capacity=self.capacity)
+        for item in self.items:
+            clones[item] = clone = item.clone()
+            clone.parent = inventory
+            inventory.items.append(clone)
+        return inventory
+
     def drop(self, item: Item) -> None:
         """
         Removes an item from the inventory and restores it to the game map, at the player's current location.
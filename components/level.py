@@ -9,6 +9,8 @@ if TYPE_CHECKING:
 
 
 class Level(BaseComponent):
+    __slots__ = ("current_level", "current_xp", "level_up_base", "level_up_factor", "xp_given")
+
     parent: Actor
 
     def __init__(
@@ -25,6 +27,14 @@ class Level(BaseComponent):
         self.level_up_factor = level_up_factor
         self.xp_given = xp_given
 
+    def copy(self) -> Level:
+        return Level(
+            current_level=self.current_level,
+            current_xp=self.current_xp,
+            level_up_base=self.level_up_base,
+            level_up_factor=self.level_up_factor,
+            xp_given=self.xp_given,
+        )
     
     @property
     def experience_to_next_level(self) -> int:
@@ -66,6 +76,8 @@ class Level(BaseComponent):
 
     def increase_power(self, amount: int = 1) -> None:
         self.parent.fighter.base_power += amount
+        self.parent.fighter.invalidate_stats()
+        self.gamemap.actor_changed(self.parent)
 
         self.engine.message_log.add_message(
             self.engine.translation.translate("increase_power")
@@ -75,6 +87,8 @@ class Level(BaseComponent):
 
     def increase_defense(self, amount: int = 1) -> None:
         self.parent.fighter.base_defense += amount
+        self.parent.fighter.invalidate_stats()
+        self.gamemap.actor_changed(self.parent)
 
         self.engine.message_log.add_message(
             self.engine.translation.translate("increase_defense")
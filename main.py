@@ -1,4 +1,6 @@
 #!E:\Alejandro\Python\venv\roguelike_tutorial\Scripts\python
+import argparse
+import time
 import traceback
 
 import tcod
@@ -12,6 +14,7 @@ import scripts.color as color
 
 
 import scripts.exceptions as exceptions
+import scripts.profiling as profiling
 import scripts.input_handlers as input_handlers
 import scripts.setup_game as setup_game
 
@@ -22,14 +25,44 @@ def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
         handler.engine.save_as(filename)
         print("Game saved.")
 
+def save_replay(handler: input_handlers.BaseEventHandler, filename: str) -> None:
+    """If the current event handler has an active, seeded Engine then save its replay."""
+    if isinstance(handler, input_handlers.EventHandler) and handler.engine.replay is not None:
+        handler.engine.replay.save(filename)
+        print("Replay saved.")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Crypts of the Embered")
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const=scripts.game_data.trace_filename,
+        default=os.environ.get("CRYPTS_TRACE"),
+        metavar="FILE",
+        help="Write a Chrome/Perfetto trace of the session to FILE on exit.",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        default=bool(os.environ.get("CRYPTS_DEBUG")),
+        help="Enable the debug keys: F3 stats overlay, F5 turn profiler and F9 rewind.",
+    )
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.trace:
+        profiling.tracer.begin(args.trace)
+    if args.debug:
+        scripts.game_data.debug_keys = True
+
     screen_width = scripts.game_data.screen_width
     screen_height = scripts.game_data.screen_height
 
     os.environ["SDL_RENDER_SCALE_QUALITY"] = "nearest"
 
     tileset = tcod.tileset.load_tilesheet(
-        "resources/terminal16x16_gs_ro.png", 16, 16, tcod.tileset.CHARMAP_CP437
+        scripts.game_data.tileset_filename, 16, 16, tcod.tileset.CHARMAP_CP437
     )
     #tileset = tcod.tileset.load_truetype_font(
     #    "resources/PxPlus_HP_100LX_16x12.ttf", 16, 16
@@ -53,13 +86,24 @@ def main():
         try:
             while True:
                 root_console.clear(bg=color.console_bg)
+                frame_start = time.perf_counter()
                 handler.on_render(console=root_console)
+                profiling.measure("frame", time.perf_counter() - frame_start)
                 context.present(root_console, keep_aspect=True, integer_scaling=True)
 
                 try:
-                    for event in tcod.event.wait():
+                    # Drain everything queued since the last frame and handle it before rendering again.
+                    events = input_handlers.coalesce_events(
+                        tcod.event.wait(), scripts.game_data.max_queued_moves, lambda: handler
+                    )
+                    for event in events:
                         context.convert_event(event)
-                        handler = handler.handle_events(event)
+                        previous_handler, handler = handler, handler.handle_events(event)
+                        if isinstance(previous_handler, input_handlers.EventHandler) and isinstance(
+                            handler, setup_game.MainMenu
+                        ):
+                            # Leaving a game for the menu, like after winning it.
+                            save_replay(previous_handler, scripts.game_data.replay_filename)
                 except Exception:  # Handle exceptions in game.
                     traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
@@ -68,12 +112,15 @@ def main():
                             traceback.format_exc(), color.error
                         )
         except exceptions.QuitWithoutSaving:
+            save_replay(handler, scripts.game_data.replay_filename)
             raise
         except SystemExit:  # Save and quit.
             save_game(handler, "savegame.sav")
+            save_replay(handler, scripts.game_data.replay_filename)
             raise
         except BaseException:  # Save on any other unexpected exception.
             save_game(handler, "savegame.sav")
+            save_replay(handler, scripts.game_data.replay_filename)
             raise
 
 
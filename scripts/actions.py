@@ -4,6 +4,7 @@ from typing import Optional, Tuple, TYPE_CHECKING
 
 import scripts.color as color
 import scripts.exceptions as exceptions
+from scripts.slots import Slotted
 
 if TYPE_CHECKING:
     from scripts.engine import Engine
@@ -12,7 +13,14 @@ if TYPE_CHECKING:
 
 
 
-class Action:
+def melee_damage(power: int, defense: int) -> int:
+    """Damage a melee attack with `power` deals to a target with `defense`, 0 if it's blocked."""
+    return max(0, power - defense)
+
+
+class Action(Slotted):
+    __slots__ = ("entity",)
+
     def __init__(self, entity: Actor) -> None:
         super().__init__()
         self.entity = entity
@@ -38,6 +46,8 @@ class Action:
 class PickupAction(Action):
     """Pickup an item and add it to the inventory, if there is room for it."""
 
+    __slots__ = ()
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
 
@@ -51,7 +61,7 @@ class PickupAction(Action):
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible(self.engine.translation.translate("inventory_full"))
 
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
 
@@ -67,6 +77,8 @@ class PickupAction(Action):
         
 
 class ItemAction(Action):
+    __slots__ = ("item", "target_xy")
+
     def __init__(
         self,
         entity: Actor,
@@ -91,6 +103,8 @@ class ItemAction(Action):
         
     
 class DropItem(ItemAction):
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.entity.equipment.item_is_equipped(self.item):
             self.entity.equipment.toggle_equip(self.item)
@@ -99,6 +113,8 @@ class DropItem(ItemAction):
 
 
 class EquipAction(Action):
+    __slots__ = ("item",)
+
     def __init__(self, entity: Actor, item: Item):
         super().__init__(entity)
 
@@ -109,11 +125,15 @@ class EquipAction(Action):
         
     
 class WaitAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         pass
 
 
 class TakeStairsAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         """
         Take the stairs, if any exist at the entity's location.
@@ -128,6 +148,8 @@ class TakeStairsAction(Action):
         
 
 class ActionWithDirection(Action):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
 
@@ -157,6 +179,8 @@ class ActionWithDirection(Action):
 
 
 class BumpAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.target_actor:
             return MeleeAction(self.entity, self.dx, self.dy).perform()
@@ -166,13 +190,15 @@ class BumpAction(ActionWithDirection):
          
 
 class MeleeAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         target = self.target_actor
 
         if not target or target == self:
             raise exceptions.Impossible(self.engine.translation.translate("nothing_to_attack"))
         
-        damage = self.entity.fighter.power - target.fighter.defense
+        damage = melee_damage(self.entity.fighter.power, target.fighter.defense)
 
         attack_desc = self.engine.translation.translate("attack_desc", entity=self.entity.name.capitalize(), target=target.name)
         
@@ -193,6 +219,8 @@ class MeleeAction(ActionWithDirection):
 
 
 class MovementAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         dest_x, dest_y = self.dest_xy
 
@@ -0,0 +1,133 @@
+"""
+Columnar copy of the actors of a GameMap, for vectorized queries over all of them.
+
+The Actor and Fighter objects stay the source of truth, the GameMap hooks keep
+one row per actor in sync with them: `entity_changed` for position and HP,
+`actor_changed` for everything else.
+"""
+from __future__ import annotations
+
+
+from typing import Dict, Iterable, List, TYPE_CHECKING
+
+
+import numpy as np  # type: ignore
+
+
+if TYPE_CHECKING:
+    from scripts.entity import Actor
+
+
+class ActorTable:
+    """
+    One row per actor, dead ones included until they're removed from the map.
+    Rows are packed: removing an actor moves the last row into its place.
+    Only the first `len(table)` rows of the arrays are valid, use the properties.
+    """
+
+    def __init__(self, actors: Iterable[Actor] = (), capacity: int = 32):
+        self.actors: List[Actor] = []
+        self.rows: Dict[Actor, int] = {}
+        self._x = np.zeros(capacity, dtype=np.int32)
+        self._y = np.zeros(capacity, dtype=np.int32)
+        self._hp = np.zeros(capacity, dtype=np.int32)
+        self._max_hp = np.zeros(capacity, dtype=np.int32)
+        self._power = np.zeros(capacity, dtype=np.int32)
+        self._defense = np.zeros(capacity, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._glyph = np.zeros(capacity, dtype=np.int32)
+        self._fg = np.zeros((capacity, 3), dtype=np.uint8)
+        for actor in actors:
+            self.add(actor)
+
+    def __len__(self) -> int:
+        return len(self.actors)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self.rows
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:len(self.actors)]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:len(self.actors)]
+
+    @property
+    def hp(self) -> np.ndarray:
+        return self._hp[:len(self.actors)]
+
+    @property
+    def max_hp(self) -> np.ndarray:
+        return self._max_hp[:len(self.actors)]
+
+    @property
+    def power(self) -> np.ndarray:
+        return self._power[:len(self.actors)]
+
+    @property
+    def defense(self) -> np.ndarray:
+        return self._defense[:len(self.actors)]
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive[:len(self.actors)]
+
+    @property
+    def glyph(self) -> np.ndarray:
+        """The character of each actor, as a Unicode codepoint."""
+        return self._glyph[:len(self.actors)]
+
+    @property
+    def fg(self) -> np.ndarray:
+        return self._fg[:len(self.actors)]
+
+    def _grow(self) -> None:
+        capacity = len(self._x) * 2
+        for name in ("_x", "_y", "_hp", "_max_hp", "_power", "_defense", "_alive", "_glyph", "_fg"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add(self, actor: Actor) -> None:
+        if actor in self.rows:
+            return
+        if len(self.actors) == len(self._x):
+            self._grow()
+        self.rows[actor] = len(self.actors)
+        self.actors.append(actor)
+        self.update(actor)
+
+    def remove(self, actor: Actor) -> None:
+        row = self.rows.pop(actor, None)
+        if row is None:
+            return
+        last = len(self.actors) - 1
+        if row != last:
+            moved = self.actors[last]
+            self.actors[row] = moved
+            self.rows[moved] = row
+            for array in (
+                self._x, self._y, self._hp, self._max_hp, self._power,
+                self._defense, self._alive, self._glyph, self._fg,
+            ):
+                array[row] = array[last]
+        self.actors.pop()
+
+    def update(self, actor: Actor) -> None:
+        """Copy the current state of an actor into its row."""
+        row = self.rows.get(actor)
+        if row is None:
+            return
+        fighter = actor.fighter
+        self._x[row] = actor.x
+        self._y[row] = actor.y
+        self._hp[row] = fighter.hp
+        self._max_hp[row] = fighter.max_hp
+        self._power[row] = fighter.power
+        self._defense[row] = fighter.defense
+        self._alive[row] = actor.is_alive
+        self._glyph[row] = ord(actor.char)
+        self._fg[row] = actor.color
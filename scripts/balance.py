@@ -0,0 +1,208 @@
+"""
+Balance simulator: generate many floors per depth and fight their monsters.
+
+Floors are generated with the real `procgen` code, so the spawn tables in
+`procgen` and the stats in `entity_factories` can be changed and evaluated in
+a single run. Fights use the real melee formula, `actions.melee_damage`.
+
+Run it from the game folder, for example:
+
+    python -m scripts.balance --seeds 2000 --workers 8
+    python -m scripts.balance --seeds 500 --player-power 5 --report balance.json
+"""
+from __future__ import annotations
+
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+
+import numpy as np  # type: ignore
+
+import scripts.entity_factories as entity_factories
+import scripts.procgen as procgen
+from scripts.actions import melee_damage
+from scripts.entity import Actor
+from scripts.game_data import MAX_FLOOR
+
+
+# Player stats as (hp, power, defense).
+Stats = Tuple[int, int, int]
+
+
+def monster_prototypes() -> List[Actor]:
+    """Every monster the spawn tables can place, in table order."""
+    monsters: List[Actor] = []
+    for chances in procgen.enemy_chances.values():
+        for entity, _ in chances:
+            if entity not in monsters:
+                monsters.append(entity)  # type: ignore
+    return monsters
+
+
+def starting_player_stats() -> Stats:
+    """The stats of a new player, with the starting dagger and leather armor equipped."""
+    player = entity_factories.player
+    return (
+        player.fighter.max_hp,
+        player.fighter.base_power + (entity_factories.dagger.equippable.power_bonus or 0),
+        player.fighter.base_defense + (entity_factories.leather_armor.equippable.defense_bonus or 0),
+    )
+
+
+def hits_to_kill(hp: int, damage: int) -> float:
+    """How many hits of `damage` take `hp` down to 0, infinite if the hits do no damage."""
+    return math.ceil(hp / damage) if damage > 0 else math.inf
+
+
+def time_to_kill(actors: List[Tuple[str, Stats]]) -> Dict[str, Dict[str, float]]:
+    """
+    Hits each actor needs to kill every other one, as matrix[attacker][defender].
+    Melee has no randomness, so this is exact.
+    """
+    return {
+        attacker: {
+            defender: hits_to_kill(defender_stats[0], melee_damage(attacker_stats[1], defender_stats[2]))
+            for defender, defender_stats in actors
+        }
+        for attacker, attacker_stats in actors
+    }
+
+
+def fight(player: Stats, monster: Stats) -> int:
+    """
+    Damage the player takes killing `monster` in melee, striking first.
+    The monster hits back after every hit that doesn't kill it.
+    """
+    hits = hits_to_kill(monster[0], melee_damage(player[1], monster[2]))
+    damage = melee_damage(monster[1], player[2])
+    if hits == math.inf:
+        return player[0] if damage > 0 else 0   # The player can't win.
+    return (int(hits) - 1) * damage
+
+
+def generate_floors(seed: int) -> List[Dict[str, Any]]:
+    """
+    Start a game with `seed` and generate every floor down to MAX_FLOOR.
+    Returns, per floor, the names of the monsters and items on it.
+    """
+    from scripts.setup_game import new_game
+
+    engine = new_game(seed)
+    floors = []
+    while True:
+        game_map = engine.game_map
+        floors.append({
+            "floor": engine.game_world.current_floor,
+            "monsters": [actor.name for actor in game_map.actors if actor is not engine.player],
+            "items": [item.name for item in game_map.items],
+        })
+        if engine.game_world.current_floor >= MAX_FLOOR:
+            return floors
+        engine.game_world.generate_floor()
+
+
+def simulate(seeds: range, workers: int, player: Stats) -> Dict[str, Any]:
+    """Generate the floors of every seed in worker processes and fight their monsters."""
+    monsters = monster_prototypes()
+    stats = {
+        monster.name: (monster.fighter.max_hp, monster.fighter.base_power, monster.fighter.base_defense)
+        for monster in monsters
+    }
+    damage_by_monster = {name: fight(player, monster) for name, monster in stats.items()}
+
+    with multiprocessing.Pool(workers) as pool:
+        games = pool.map(generate_floors, seeds, chunksize=max(1, len(seeds) // (workers * 4)))
+
+    report: Dict[str, Any] = {
+        "seeds": len(seeds),
+        "player": {"hp": player[0], "power": player[1], "defense": player[2]},
+        "time_to_kill": time_to_kill([("player", player), *stats.items()]),
+        "floors": [],
+    }
+    for floor in range(1, MAX_FLOOR + 1):
+        generated = [game[floor - 1] for game in games if len(game) >= floor]
+        monster_counts = np.array([len(f["monsters"]) for f in generated])
+        item_counts = np.array([len(f["items"]) for f in generated])
+        # Fights on a floor happen one after the other, without resting.
+        damage = np.array([sum(damage_by_monster[name] for name in f["monsters"]) for f in generated])
+        spawns: Dict[str, int] = {}
+        for f in generated:
+            for name in f["monsters"] + f["items"]:
+                spawns[name] = spawns.get(name, 0) + 1
+        report["floors"].append({
+            "floor": floor,
+            "monsters_mean": float(monster_counts.mean()),
+            "items_mean": float(item_counts.mean()),
+            "spawns_per_floor": {name: count / len(generated) for name, count in sorted(spawns.items())},
+            "damage_mean": float(damage.mean()),
+            "damage_p50": float(np.percentile(damage, 50)),
+            "damage_p90": float(np.percentile(damage, 90)),
+            "damage_max": int(damage.max()),
+            "deadly": float((damage >= player[0]).mean()),
+        })
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    player = report["player"]
+    print(
+        f"Seeds: {report['seeds']}  Player: {player['hp']} HP, "
+        f"{player['power']} power, {player['defense']} defense"
+    )
+
+    matrix = report["time_to_kill"]
+    names = list(matrix)
+    print("\nHits to kill (rows attack columns):")
+    print(" " * 12 + "".join(f"{name[:10]:>11}" for name in names))
+    for attacker in names:
+        print(f"{attacker[:12]:<12}" + "".join(f"{matrix[attacker][defender]:>11}" for defender in names))
+
+    print("\nPer floor (damage is taken fighting every monster of the floor without healing):")
+    print(f"{'floor':>5}{'monsters':>10}{'items':>8}{'damage':>9}{'p50':>6}{'p90':>6}{'max':>6}{'deadly':>8}")
+    for floor in report["floors"]:
+        print(
+            f"{floor['floor']:>5}{floor['monsters_mean']:>10.2f}{floor['items_mean']:>8.2f}"
+            f"{floor['damage_mean']:>9.1f}{floor['damage_p50']:>6.0f}{floor['damage_p90']:>6.0f}"
+            f"{floor['damage_max']:>6}{floor['deadly']:>8.1%}"
+        )
+
+    print("\nSpawns per floor:")
+    for floor in report["floors"]:
+        spawns = ", ".join(f"{name} {count:.2f}" for name, count in floor["spawns_per_floor"].items())
+        print(f"{floor['floor']:>5}  {spawns}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    hp, power, defense = starting_player_stats()
+
+    parser = argparse.ArgumentParser(description="Generate many floors per depth and simulate their fights.")
+    parser.add_argument("--seeds", type=int, default=1000, help="Games to generate, each one goes down every floor.")
+    parser.add_argument("--start-seed", type=int, default=0, help="First seed.")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Worker processes.")
+    parser.add_argument("--player-hp", type=int, default=hp)
+    parser.add_argument("--player-power", type=int, default=power)
+    parser.add_argument("--player-defense", type=int, default=defense)
+    parser.add_argument("--report", metavar="FILE", help="Also write the report as JSON to FILE.")
+    args = parser.parse_args(argv)
+
+    report = simulate(
+        range(args.start_seed, args.start_seed + args.seeds),
+        args.workers,
+        (args.player_hp, args.player_power, args.player_defense),
+    )
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Micro benchmarks for the hot paths of the game.
+
+Run them from the game folder, for example:
+
+    python -m scripts.benchmark spawn --count 10000
+    python -m scripts.benchmark memory --count 10000
+    python -m scripts.benchmark access
+    python -m scripts.benchmark dice --count 1000000
+    python -m scripts.benchmark rooms --attempts 5000 --size 400
+    python -m scripts.benchmark generators --floors 50
+"""
+from __future__ import annotations
+
+
+import argparse
+import copy
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import Callable, List, Optional
+
+
+import numpy as np  # type: ignore
+
+import scripts.entity_factories as entity_factories
+import scripts.game_data as game_data
+from scripts.dice import compile_dice
+from scripts.entity import Entity
+from scripts.game_map import GameMap
+from scripts.pipeline import GENERATORS, STAGES
+from scripts.procgen import RectangularRoom, RoomPlacer
+
+
+SPAWN_PROTOTYPES: List[Entity] = [
+    entity_factories.imp,
+    entity_factories.vampire,
+    entity_factories.minotaur,
+    entity_factories.health_potion,
+    entity_factories.fireball_scroll,
+    entity_factories.sword,
+]
+
+
+def best_of(repeat: int, function: Callable[[], None]) -> float:
+    """Run `function` `repeat` times and return the fastest run in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def deepcopy_spawn(prototype: Entity, gamemap: GameMap, x: int, y: int) -> Entity:
+    """How `Entity.spawn` used to copy prototypes."""
+    clone = copy.deepcopy(prototype)
+    clone.x = x
+    clone.y = y
+    clone.parent = gamemap
+    gamemap.add_entity(clone)
+    return clone
+
+
+def benchmark_spawn(count: int, repeat: int) -> None:
+    """Spawn `count` entities on an empty map, with `Entity.spawn` and with deepcopy."""
+    rng = random.Random(0)
+    spawns = [
+        (rng.choice(SPAWN_PROTOTYPES), rng.randrange(game_data.map_width), rng.randrange(game_data.map_height))
+        for _ in range(count)
+    ]
+
+    def run(spawn: Callable[[Entity, GameMap, int, int], Entity]) -> Callable[[], None]:
+        def spawn_all() -> None:
+            gamemap = GameMap(None, game_data.map_width, game_data.map_height)  # type: ignore
+            for prototype, x, y in spawns:
+                spawn(prototype, gamemap, x, y)
+        return spawn_all
+
+    results = {
+        "deepcopy": best_of(repeat, run(deepcopy_spawn)),
+        "spawn": best_of(repeat, run(lambda prototype, gamemap, x, y: prototype.spawn(gamemap, x, y))),
+    }
+    for name, seconds in results.items():
+        print(f"{name:<10}{seconds * 1000:>9.1f}ms {seconds / count * 1e6:>8.2f}us/entity")
+    print(f"Speedup: {results['deepcopy'] / results['spawn']:.1f}x")
+
+
+def benchmark_memory(count: int) -> None:
+    """Measure the memory used per spawned entity, components included."""
+    gamemap = GameMap(None, game_data.map_width, game_data.map_height)  # type: ignore
+    for prototype in SPAWN_PROTOTYPES:
+        tracemalloc.start()
+        entities = [prototype.spawn(gamemap, 0, 0) for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{prototype.name:<24}{size / len(entities):>8.0f} bytes/entity")
+        for entity in entities:
+            gamemap.remove_entity(entity)
+
+
+def benchmark_access(number: int, repeat: int) -> None:
+    """Time the attribute reads of the hot paths: positions, HP and AI."""
+    actor = entity_factories.imp.clone()
+    item = entity_factories.health_potion.clone()
+    statements = {
+        "actor.x": lambda: actor.x,
+        "actor.fighter.hp": lambda: actor.fighter.hp,
+        "actor.fighter.power": lambda: actor.fighter.power,
+        "actor.ai": lambda: actor.ai,
+        "item.consumable": lambda: item.consumable,
+    }
+    for name, statement in statements.items():
+        seconds = min(timeit.repeat(statement, number=number, repeat=repeat))
+        print(f"{name:<24}{seconds / number * 1e9:>8.1f}ns")
+
+
+def benchmark_dice(count: int, repeat: int) -> None:
+    """Roll dice expressions `count` times, one by one and in a NumPy batch."""
+    generator = np.random.default_rng(0)
+    for text in ("1d20", "3d6+2", "2d8kh1", "1d4*2"):
+        expression = compile_dice(text)
+        single = best_of(repeat, lambda: [expression.roll() for _ in range(count // 100)]) * 100
+        batch = best_of(repeat, lambda: expression.roll_many(count, generator))
+        print(
+            f"{text:<10}{count / single / 1e6:>8.2f}M rolls/s single"
+            f"{count / batch / 1e6:>10.2f}M rolls/s batched"
+        )
+
+
+def benchmark_rooms(attempts: int, size: int, repeat: int) -> None:
+    """Place rooms on a `size` x `size` map, testing overlaps room by room and with the bitmap."""
+    rng = random.Random(0)
+    candidates = []
+    for _ in range(attempts):
+        width = rng.randint(game_data.room_min_size, game_data.room_max_size)
+        height = rng.randint(game_data.room_min_size, game_data.room_max_size)
+        x = rng.randint(0, size - width - 1)
+        y = rng.randint(0, size - height - 1)
+        candidates.append(RectangularRoom(x, y, width, height))
+
+    def pairwise() -> None:
+        rooms: List[RectangularRoom] = []
+        for room in candidates:
+            if not any(room.intersects(other) for other in rooms):
+                rooms.append(room)
+
+    def bitmap() -> None:
+        placer = RoomPlacer(size, size)
+        for room in candidates:
+            placer.try_place(room)
+
+    results = {"pairwise": best_of(repeat, pairwise), "bitmap": best_of(repeat, bitmap)}
+    for name, seconds in results.items():
+        print(f"{name:<10}{seconds * 1000:>9.1f}ms {seconds / attempts * 1e6:>8.2f}us/attempt")
+    placer = RoomPlacer(size, size)
+    for room in candidates:
+        placer.try_place(room)
+    print(f"Rooms: {placer.accepted}/{placer.attempts} ({placer.acceptance_rate:.1%} accepted)")
+    print(f"Speedup: {results['pairwise'] / results['bitmap']:.1f}x")
+
+
+def benchmark_generators(floors: int) -> None:
+    """Generate `floors` floors with every dungeon generator, timing each stage of the pipeline ones."""
+    from scripts.setup_game import new_game
+
+    engine = new_game(0)
+    game_world = engine.game_world
+    print(f"{'generator':<14}" + "".join(f"{stage:>10}" for stage in STAGES) + f"{'total':>10}  (ms per floor)")
+    for generator in GENERATORS:
+        game_world.generator = generator
+        game_world.current_floor = 0
+        totals = dict.fromkeys(STAGES, 0.0)
+        start = time.perf_counter()
+        for _ in range(floors):
+            game_world.generate_floor()
+            for stage, seconds in (engine.game_map.generation_times or {}).items():
+                totals[stage] += seconds
+            game_world.current_floor = 0
+        total = (time.perf_counter() - start) / floors
+        stages = "".join(
+            f"{totals[stage] / floors * 1000:>10.2f}" if engine.game_map.generation_times else f"{'-':>10}"
+            for stage in STAGES
+        )
+        print(f"{generator:<14}{stages}{total * 1000:>10.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro benchmarks for the hot paths of the game.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each benchmark, the fastest is reported.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    spawn = subparsers.add_parser("spawn", help="Mass-spawn entities from their prototypes.")
+    spawn.add_argument("--count", type=int, default=10000)
+
+    memory = subparsers.add_parser("memory", help="Memory used per spawned entity.")
+    memory.add_argument("--count", type=int, default=10000)
+
+    access = subparsers.add_parser("access", help="Attribute access time of entities and components.")
+    access.add_argument("--number", type=int, default=1000000)
+
+    dice = subparsers.add_parser("dice", help="Dice expression rolls, single and batched.")
+    dice.add_argument("--count", type=int, default=1000000)
+
+    rooms = subparsers.add_parser("rooms", help="Room overlap tests of the dungeon generator.")
+    rooms.add_argument("--attempts", type=int, default=5000)
+    rooms.add_argument("--size", type=int, default=400, help="Width and height of the map.")
+
+    generators = subparsers.add_parser("generators", help="Cost of each dungeon generator, by stage.")
+    generators.add_argument("--floors", type=int, default=50)
+
+    args = parser.parse_args(argv)
+
+    if args.benchmark == "spawn":
+        benchmark_spawn(args.count, args.repeat)
+    elif args.benchmark == "memory":
+        benchmark_memory(args.count)
+    elif args.benchmark == "access":
+        benchmark_access(args.number, args.repeat)
+    elif args.benchmark == "dice":
+        benchmark_dice(args.count, args.repeat)
+    elif args.benchmark == "rooms":
+        benchmark_rooms(args.attempts, args.size, args.repeat)
+    elif args.benchmark == "generators":
+        benchmark_generators(args.floors)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,57 @@
+"""
+Dice descriptions like "3d6", their rolls and the exact distribution of their totals.
+
+The distribution of the sum of N dice of M faces is the polynomial
+(x + x^2 + ... + x^M)^N, so the number of ways to roll each total is found by
+convolving the single die N times. Tables are cached per (N, M), so asking for
+the odds of 20d20 costs a lookup after the first time.
+
+Expressions like "3d6+2", "2d8kh1" (keep the highest die) or "1d4*2" are
+compiled once by `compile_dice` into a tree that can be rolled once with the
+game's RNG or thousands of times in a single batch with NumPy.
+"""
+from __future__ import annotations
+
+
+import functools
 import random
-import itertools
-from math import comb
+import re
+from typing import Any, Dict, List, Optional
+
+
+import numpy as np  # type: ignore
+
+
+@functools.lru_cache(maxsize=None)
+def sum_counts(times: int, num_faces: int) -> np.ndarray:
+    """
+    The number of ways `times` dice of `num_faces` faces add up to each total,
+    indexed by total - times. Python integers, so they're exact for any size.
+    Shared, don't modify it.
+    """
+    die = np.ones(num_faces, dtype=object)
+    counts = die
+    for _ in range(times - 1):
+        counts = np.convolve(counts, die)
+    counts.flags.writeable = False
+    return counts
+
+
+@functools.lru_cache(maxsize=None)
+def sum_distribution(times: int, num_faces: int) -> np.ndarray:
+    """The probability of each total of `times` dice, laid out like `sum_counts`. Shared, don't modify it."""
+    pmf = (sum_counts(times, num_faces) / num_faces ** times).astype(np.float64)
+    pmf.flags.writeable = False
+    return pmf
+
+
+@functools.lru_cache(maxsize=None)
+def cumulative_distribution(times: int, num_faces: int) -> np.ndarray:
+    """The probability of rolling at most each total, laid out like `sum_counts`. Shared, don't modify it."""
+    counts = np.cumsum(sum_counts(times, num_faces))
+    cdf = (counts / num_faces ** times).astype(np.float64)
+    cdf.flags.writeable = False
+    return cdf
 
 
 class Dice:
@@ -12,7 +63,19 @@ class Dice:
         self.num_faces = int(parts[1])
         if self.times <= 0 or self.num_faces <= 0:
             raise ValueError("Dice times and faces must be positive integers.")
-    
+
+    @property
+    def minimum(self) -> int:
+        return self.times
+
+    @property
+    def maximum(self) -> int:
+        return self.times * self.num_faces
+
+    @property
+    def expected_value(self) -> float:
+        return self.times * (self.num_faces + 1) / 2
+
     def roll(self):
         try:
             results = []
@@ -23,27 +86,224 @@ class Dice:
         except Exception as e:
             print(f"An error occurred during the roll: {e}")
             return [0]  # Return a list with one zero element to indicate an error
-        
-    def calculate_probability(self, target_value):
-        # Total number of outcomes
-        total_outcomes = self.num_faces ** self.times
-        
-        # Number of favorable outcomes
-        favorable_outcomes = 0
-        
-        for r in range(1, self.times + 1):
-            for combo in itertools.product(range(1, self.num_faces + 1), repeat=r):
-                if sum(combo) == target_value:
-                    favorable_outcomes += comb(self.times, r)
-        
-        # Calculate probability
-        probability = (favorable_outcomes / total_outcomes) * 100
-        return probability
-    
-    def dice_probability_table(self, target_value):
-        table = {}
-        for i in range(1, self.num_faces + 1):
-            for j in range(1, self.num_faces + 1):
-                table[i, j] = (i + j) / 2
-        return table
 
+    def pmf(self, total: int) -> float:
+        """The probability of rolling exactly `total`."""
+        if not self.minimum <= total <= self.maximum:
+            return 0.0
+        return float(sum_distribution(self.times, self.num_faces)[total - self.minimum])
+
+    def cdf(self, total: int) -> float:
+        """The probability of rolling at most `total`."""
+        if total < self.minimum:
+            return 0.0
+        if total >= self.maximum:
+            return 1.0
+        return float(cumulative_distribution(self.times, self.num_faces)[total - self.minimum])
+
+    def calculate_probability(self, target_value: int) -> float:
+        """The chance of rolling exactly `target_value`, as a percentage."""
+        return self.pmf(target_value) * 100
+
+    def dice_probability_table(self) -> Dict[int, float]:
+        """The chance of rolling each possible total, as a percentage."""
+        pmf = sum_distribution(self.times, self.num_faces)
+        return {
+            total: float(probability) * 100
+            for total, probability in enumerate(pmf, start=self.minimum)
+        }
+
+
+class DiceExpression:
+    """
+    A compiled dice expression. `roll` rolls it once with the game's RNG,
+    `roll_many` rolls it `count` times at once with NumPy.
+    """
+
+    minimum: int
+    maximum: int
+
+    def roll(self, rng: Optional[random.Random] = None) -> int:
+        raise NotImplementedError()
+
+    def roll_many(self, count: int, generator: Optional[np.random.Generator] = None) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class Constant(DiceExpression):
+    def __init__(self, value: int):
+        self.value = value
+        self.minimum = self.maximum = value
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def roll(self, rng: Optional[random.Random] = None) -> int:
+        return self.value
+
+    def roll_many(self, count: int, generator: Optional[np.random.Generator] = None) -> np.ndarray:
+        return np.full(count, self.value, dtype=np.int64)
+
+
+class DiceRoll(DiceExpression):
+    """NdM, keeping only the `keep` highest (or lowest) dice if given."""
+
+    def __init__(self, times: int, num_faces: int, keep: Optional[int] = None, highest: bool = True):
+        if times <= 0 or num_faces <= 0:
+            raise ValueError("Dice times and faces must be positive integers.")
+        if keep is not None and keep <= 0:
+            raise ValueError("The number of dice kept must be a positive integer.")
+        self.times = times
+        self.num_faces = num_faces
+        self.keep = keep if keep is not None and keep < times else None
+        self.highest = highest
+        kept = self.keep or times
+        self.minimum = kept
+        self.maximum = kept * num_faces
+        self.description = f"{times}d{num_faces}" + (
+            f"{'kh' if highest else 'kl'}{keep}" if keep is not None else ""
+        )
+
+    def __str__(self) -> str:
+        return self.description
+
+    def roll(self, rng: Optional[random.Random] = None) -> int:
+        randrange = (rng or random).randrange
+        rolls = [randrange(self.num_faces) + 1 for _ in range(self.times)]
+        if self.keep is None:
+            return sum(rolls)
+        rolls.sort(reverse=self.highest)
+        return sum(rolls[:self.keep])
+
+    def roll_many(self, count: int, generator: Optional[np.random.Generator] = None) -> np.ndarray:
+        generator = generator or np.random.default_rng()
+        rolls = generator.integers(1, self.num_faces + 1, size=(count, self.times), dtype=np.int64)
+        if self.keep is None:
+            return rolls.sum(axis=1)
+        rolls.sort(axis=1)
+        kept = rolls[:, -self.keep:] if self.highest else rolls[:, :self.keep]
+        return kept.sum(axis=1)
+
+
+class BinaryOperation(DiceExpression):
+    """Two expressions joined by +, -, * or /. Division rounds down."""
+
+    def __init__(self, operator: str, left: DiceExpression, right: DiceExpression):
+        self.operator = operator
+        self.left = left
+        self.right = right
+        if operator == "/" and right.minimum <= 0 <= right.maximum:
+            raise ValueError("Dice expressions can't divide by something that can be zero.")
+        bounds = [
+            self.apply(a, b)
+            for a in (left.minimum, left.maximum)
+            for b in (right.minimum, right.maximum)
+        ]
+        self.minimum = min(bounds)
+        self.maximum = max(bounds)
+
+    def __str__(self) -> str:
+        return f"({self.left}{self.operator}{self.right})"
+
+    def apply(self, left: Any, right: Any) -> Any:
+        """Works on both integers and arrays."""
+        if self.operator == "+":
+            return left + right
+        if self.operator == "-":
+            return left - right
+        if self.operator == "*":
+            return left * right
+        return left // right
+
+    def roll(self, rng: Optional[random.Random] = None) -> int:
+        return self.apply(self.left.roll(rng), self.right.roll(rng))
+
+    def roll_many(self, count: int, generator: Optional[np.random.Generator] = None) -> np.ndarray:
+        generator = generator or np.random.default_rng()
+        return self.apply(self.left.roll_many(count, generator), self.right.roll_many(count, generator))
+
+
+_TOKEN = re.compile(r"\s*(?:(\d+)|(d)|(kh|kl)|([-+*/()]))")
+
+
+class _Parser:
+    """
+    Recursive descent over the tokens of an expression:
+
+        expression := term (("+" | "-") term)*
+        term       := factor (("*" | "/") factor)*
+        factor     := "(" expression ")" | [number] "d" number [("kh" | "kl") number] | number
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: List[str] = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if match is None:
+                raise ValueError(f"Invalid dice expression: {self.text!r}.")
+            self.tokens.append(match.group(match.lastindex))
+            position = match.end()
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Invalid dice expression: {self.text!r}.")
+        self.position += 1
+        return token
+
+    def number(self) -> int:
+        token = self.take()
+        if not token.isdigit():
+            raise ValueError(f"Invalid dice expression: {self.text!r}.")
+        return int(token)
+
+    def parse(self) -> DiceExpression:
+        expression = self.expression()
+        if self.peek() is not None:
+            raise ValueError(f"Invalid dice expression: {self.text!r}.")
+        return expression
+
+    def expression(self) -> DiceExpression:
+        expression = self.term()
+        while self.peek() in ("+", "-"):
+            expression = BinaryOperation(self.take(), expression, self.term())
+        return expression
+
+    def term(self) -> DiceExpression:
+        expression = self.factor()
+        while self.peek() in ("*", "/"):
+            expression = BinaryOperation(self.take(), expression, self.factor())
+        return expression
+
+    def factor(self) -> DiceExpression:
+        if self.peek() == "(":
+            self.take()
+            expression = self.expression()
+            if self.take() != ")":
+                raise ValueError(f"Invalid dice expression: {self.text!r}.")
+            return expression
+        times = self.number() if self.peek() != "d" else 1
+        if self.peek() != "d":
+            return Constant(times)
+        self.take()
+        num_faces = self.number()
+        if self.peek() in ("kh", "kl"):
+            highest = self.take() == "kh"
+            return DiceRoll(times, num_faces, self.number(), highest)
+        return DiceRoll(times, num_faces)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_dice(text: str) -> DiceExpression:
+    """
+    Compile a dice expression like "3d6+2", "2d8kh1" or "1d4*2".
+    Raises ValueError if it's not valid.
+    """
+    return _Parser(text).parse()
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import lzma
 import pickle
-from typing import TYPE_CHECKING
+import random
+from typing import Optional, TYPE_CHECKING
 
+import numpy as np  # type: ignore
 from tcod.console import Console
 from tcod.map import compute_fov
 from libtcodpy import (
@@ -16,9 +18,12 @@ from libtcodpy import (
 )
 
 import scripts.exceptions as exceptions
+import scripts.profiling as profiling
 import scripts.render_functions as render_functions
 from scripts.translation import Translation
 from scripts.message_log import MessageLog
+from scripts.replay import ReplayLog
+from scripts.snapshot import SnapshotRing
 import scripts.game_data as game_data
 import scripts.color
 
@@ -29,24 +34,64 @@ if TYPE_CHECKING:
 class Engine:
     game_map: GameMap
     game_world: GameWorld
+    seed: Optional[int] = None  # Saves made before seeding was added don't have one.
+    replay: Optional[ReplayLog] = None
+    _snapshots: Optional[SnapshotRing] = None
     
-    def __init__(self, player: Actor):
+    def __init__(self, player: Actor, seed: Optional[int] = None):
+        self.seed = seed
+        # Only seeded games can be replayed.
+        self.replay = ReplayLog(seed) if seed is not None else None
         self.translation = Translation(language="es")
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
         self.amulet_picked: bool = False
         self.player = player
 
+    @property
+    def snapshots(self) -> SnapshotRing:
+        """The recent snapshots for rewinding, they aren't saved with the game."""
+        if self._snapshots is None:
+            self._snapshots = SnapshotRing(game_data.snapshot_capacity, game_data.snapshot_interval)
+        return self._snapshots
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop("_snapshots", None)
+        # A loaded game must keep drawing the same numbers, or its replay stops matching.
+        state["_random_state"] = random.getstate()
+        state["_numpy_state"] = np.random.get_state()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        random_state = state.pop("_random_state", None)
+        numpy_state = state.pop("_numpy_state", None)
+        self.__dict__.update(state)
+        if random_state is None or numpy_state is None:
+            # Saves made before the RNG state was saved can't continue their replay.
+            self.replay = None
+        else:
+            random.setstate(random_state)
+            np.random.set_state(numpy_state)
+
     
+    @profiling.timed("enemy_turns")
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        # Go through the enemies in a fixed order, so seeded games and replays are deterministic.
+        enemies = sorted(
+            (actor for actor in self.game_map.actors if actor is not self.player),
+            key=lambda actor: (actor.y, actor.x),
+        )
+        for entity in enemies:
             if entity.ai:
                 try:
-                    entity.ai.perform()
+                    with profiling.span("ai", entity=entity.name):
+                        entity.ai.perform()
                 except exceptions.Impossible:
                     pass    # Ignore impossible action exceptions from AI.
 
 
+    @profiling.timed("update_fov")
     def update_fov(self) -> None:
         """Recompute the visible area based on the players POV."""
         self.game_map.visible[:] = compute_fov(
@@ -56,9 +101,14 @@ class Engine:
             algorithm=FOV_DIAMOND   # Default algorithm is FOV_RESTRICTIVE.
         )
         # If a tile is "visible" it should be added to "explored".
-        self.game_map.explored |= self.game_map.visible
+        if not self.game_map.explored[self.game_map.visible].all():
+            self.game_map.explored |= self.game_map.visible
+            self.game_map.explored_version += 1
+        self.game_map.visible_version += 1
 
 
+    @profiling.traced("render")
+    @profiling.profiled
     def render(self, console: Console) -> None:
         self.game_map.render_map(console)
 
@@ -93,6 +143,10 @@ class Engine:
             engine=self,
         )
 
+        if profiling.stats.enabled:
+            render_functions.render_frame_stats(console=console, x=1, y=1)
+
+    @profiling.traced("save")
     def save_as(self, filename: str) -> None:
         """Save this Engine instance as a compressed file."""
         save_data = lzma.compress(pickle.dumps(self))
@@ -3,10 +3,11 @@ from __future__ import annotations
 
 import copy
 import math
-from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
+from typing import Dict, Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
 
 from scripts.render_order import RenderOrder
+from scripts.slots import Slotted
 
 
 if TYPE_CHECKING:
@@ -23,11 +24,13 @@ T = TypeVar("T", bound="Entity")
 
 
 
-class Entity:
+class Entity(Slotted):
     """
     A generic object to represent pc, enemy, items, etc.
     """
 
+    __slots__ = ("x", "y", "char", "color", "name", "blocks_movement", "render_order", "parent")
+
     parent: Union[GameMap, Inventory]
 
     def __init__(
@@ -51,32 +54,59 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def clone(self: T) -> T:
+        """
+        Return a fresh copy of this entity without a parent.
+
+        Built with the constructors of the entity and its components, which is much
+        faster than `copy.deepcopy` walking the whole component graph.
+        """
+        return type(self)(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            blocks_movement=self.blocks_movement,
+            render_order=self.render_order,
+        )
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this instance at the give location."""
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
     
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
+            # The new map may already hold it, like the player given to a new GameMap.
+            gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        elif hasattr(self, "parent"):
+            self.gamemap.entity_changing(self)
+            self.x = x
+            self.y = y
+            self.gamemap.entity_changed(self)
+        else:
+            self.x = x
+            self.y = y
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -86,11 +116,15 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # Move the entity by a given amount
+        self.gamemap.entity_changing(self)
         self.x += dx
         self.y += dy
+        self.gamemap.entity_changed(self)
 
 
 class Actor(Entity):
+    __slots__ = ("ai", "equipment", "fighter", "inventory", "level")
+
     def __init__(
         self,
         *,
@@ -133,9 +167,34 @@ class Actor(Entity):
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
         return bool(self.ai)
+
+    def clone(self) -> Actor:
+        """
+        Return a fresh copy of this actor, see `Entity.clone`.
+        The AI is rebuilt from its class, so it must only take the entity, like the prototypes' AI.
+        """
+        clones: Dict[Item, Item] = {}
+        inventory = self.inventory.copy(clones)
+        actor = Actor(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            ai_cls=type(self.ai),
+            equipment=self.equipment.copy(clones),
+            fighter=self.fighter.copy(),
+            inventory=inventory,
+            level=self.level.copy(),
+        )
+        actor.blocks_movement = self.blocks_movement
+        actor.render_order = self.render_order
+        return actor
     
 
 class Item(Entity):
+    __slots__ = ("consumable", "equippable", "yendor")
+
     def __init__(
         self,
         *,
@@ -168,4 +227,20 @@ class Item(Entity):
         if self.equippable:
             self.equippable.parent = self
 
-        self.yendor = yendor
\ No newline at end of file
+        self.yendor = yendor
+
+    def clone(self) -> Item:
+        """
+        Return a fresh copy of this item, see `Entity.clone`.
+        Consumables and equippables only hold their settings, so a shallow copy of them is enough.
+        """
+        return Item(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            consumable=copy.copy(self.consumable),
+            equippable=copy.copy(self.equippable),
+            yendor=self.yendor,
+        )
@@ -0,0 +1,364 @@
+"""
+Gym-style environment around a game session, for training and evaluating bots.
+
+`DungeonEnv` runs a single game in this process. `VectorDungeonEnv` steps several
+independent games across worker processes, the observations, actions, rewards and
+done flags are exchanged through shared memory so nothing is pickled per step.
+
+The game draws from the global `random` and `np.random` generators, so every
+`DungeonEnv` keeps its own copy of their state and swaps it in while its game
+runs. Several environments in the same process don't disturb each other, and a
+seed plays the same game whatever the number of worker processes.
+"""
+from __future__ import annotations
+
+
+import contextlib
+import multiprocessing
+import random
+import traceback
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+import numpy as np  # type: ignore
+
+import scripts.actions as actions
+import scripts.game_data as game_data
+import scripts.input_handlers as input_handlers
+import scripts.setup_game as setup_game
+from scripts.engine import Engine
+
+
+DIRECTIONS: List[Tuple[int, int]] = [
+    (0, -1),    # North
+    (1, -1),    # Northeast
+    (1, 0),     # East
+    (1, 1),     # Southeast
+    (0, 1),     # South
+    (-1, 1),    # Southwest
+    (-1, 0),    # West
+    (-1, -1),   # Northwest
+]
+WAIT = len(DIRECTIONS)
+PICKUP = WAIT + 1
+TAKE_STAIRS = WAIT + 2
+NUM_ACTIONS = TAKE_STAIRS + 1
+
+CHANNELS = (
+    "walkable",
+    "transparent",
+    "visible",
+    "explored",
+    "stairs",
+    "player",
+    "actors",   # Living actors other than the player, only where visible.
+    "items",    # Items on the floor, only where visible.
+)
+
+OBSERVATION_SHAPE = (len(CHANNELS), game_data.map_width, game_data.map_height)
+
+# Rewards.
+DESCEND_REWARD = 10.0
+DEATH_REWARD = -10.0
+VICTORY_REWARD = 100.0
+
+
+def make_action(engine: Engine, index: int) -> actions.Action:
+    """Return the player action for an action index of the environment."""
+    player = engine.player
+    if index < WAIT:
+        return actions.BumpAction(player, *DIRECTIONS[index])
+    elif index == WAIT:
+        return actions.WaitAction(player)
+    elif index == PICKUP:
+        return actions.PickupAction(player)
+    elif index == TAKE_STAIRS:
+        return actions.TakeStairsAction(player)
+    raise ValueError(f"Invalid action index: {index}")
+
+
+class DungeonEnv:
+    """
+    A single game session with a reset(seed)/step(action) interface.
+
+    Observations are uint8 arrays of shape `OBSERVATION_SHAPE`, one channel per
+    name in `CHANNELS`. Level ups are resolved automatically by raising max HP.
+    """
+
+    def __init__(self, max_turns: int = 5000):
+        self.max_turns = max_turns
+        self.engine: Optional[Engine] = None
+        self.handler: Optional[input_handlers.EventHandler] = None
+        self.turn = 0
+        # The states of `random` and `np.random` of this game while it isn't running.
+        self.rng_state: Optional[Tuple[Any, Any]] = None
+
+    @contextlib.contextmanager
+    def use_rng_state(self) -> Iterator[None]:
+        """Swap the RNG state of this game into `random` and `np.random` for the duration of the block."""
+        outer_state = random.getstate(), np.random.get_state()
+        if self.rng_state is not None:
+            random.setstate(self.rng_state[0])
+            np.random.set_state(self.rng_state[1])
+        try:
+            yield
+        finally:
+            self.rng_state = random.getstate(), np.random.get_state()
+            random.setstate(outer_state[0])
+            np.random.set_state(outer_state[1])
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        with self.use_rng_state():
+            if seed is None:
+                # Don't continue the previous game's draws, or share them with other environments.
+                random.seed()
+                np.random.seed()
+            self.engine = setup_game.new_game(seed)
+        self.handler = input_handlers.MainGameEventHandler(self.engine)
+        self.turn = 0
+        return self.observation()
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, Dict[str, Any]]:
+        """
+        Perform an action index. Returns the observation, the reward,
+        whether the episode is over and an info dictionary.
+        """
+        reward, done, info = self.play(action)
+        return self.observation(), reward, done, info
+
+    def play(self, action: int) -> Tuple[float, bool, Dict[str, Any]]:
+        """Like `step`, but without building the observation."""
+        assert self.engine is not None and self.handler is not None, "Call reset() first."
+        engine = self.engine
+        player = engine.player
+
+        floor = engine.game_world.current_floor
+        xp = player.level.current_xp
+
+        # The replay hashes the RNG state too, so level ups are recorded inside the block.
+        with self.use_rng_state():
+            performed = self.handler.handle_action(make_action(engine, action))
+
+            # Experience gained this turn, counted before leveling up spends it.
+            reward = float(player.level.current_xp - xp)
+            reward += DESCEND_REWARD * (engine.game_world.current_floor - floor)
+
+            if player.is_alive and player.level.requires_level_up:
+                player.level.increase_max_hp()
+                if engine.replay is not None:
+                    engine.replay.record_level_up(0, engine)
+        if performed:
+            self.turn += 1
+
+        done = False
+        if not player.is_alive:
+            reward += DEATH_REWARD
+            done = True
+        elif engine.amulet_picked:
+            reward += VICTORY_REWARD
+            done = True
+        truncated = self.turn >= self.max_turns
+
+        info = {
+            "performed": performed,
+            "turn": self.turn,
+            "floor": engine.game_world.current_floor,
+            "hp": player.fighter.hp,
+            "truncated": truncated,
+        }
+        return reward, done or truncated, info
+
+    def observation(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Build the observation tensor, writing it into `out` if given."""
+        assert self.engine is not None, "Call reset() first."
+        game_map = self.engine.game_map
+        player = self.engine.player
+
+        if out is None:
+            out = np.zeros(OBSERVATION_SHAPE, dtype=np.uint8)
+        else:
+            out[:] = 0
+
+        out[0] = game_map.tiles["walkable"]
+        out[1] = game_map.tiles["transparent"]
+        out[2] = game_map.visible
+        out[3] = game_map.explored
+        out[4][game_map.downstairs_location] = game_map.explored[game_map.downstairs_location]
+        out[5, player.x, player.y] = 1
+
+        visible = game_map.visible
+        actor_table = game_map.actor_table
+        shown = actor_table.alive & visible[actor_table.x, actor_table.y]
+        out[6, actor_table.x[shown], actor_table.y[shown]] = 1
+        out[6, player.x, player.y] = 0
+        for item in game_map.items:
+            if visible[item.x, item.y]:
+                out[7, item.x, item.y] = 1
+
+        return out
+
+
+def _attach(name: str, shape: Tuple[int, ...], dtype: Any) -> Tuple[SharedMemory, np.ndarray]:
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _worker(
+    conn: Connection,
+    buffers: Dict[str, Tuple[str, Tuple[int, ...], Any]],
+    indices: Sequence[int],
+    max_turns: int,
+) -> None:
+    """
+    Run the games in `indices`, reading actions and writing results in shared memory.
+    Answers every command with None, or with the traceback of an error before exiting.
+    """
+    shared = {key: _attach(*spec) for key, spec in buffers.items()}
+    observations = shared["observations"][1]
+    actions_array = shared["actions"][1]
+    rewards = shared["rewards"][1]
+    dones = shared["dones"][1]
+    seeds = shared["seeds"][1]
+
+    envs = {index: DungeonEnv(max_turns) for index in indices}
+
+    def reset(index: int) -> None:
+        seed = int(seeds[index])
+        envs[index].reset(seed if seed >= 0 else None)
+        envs[index].observation(out=observations[index])
+
+    try:
+        while True:
+            command = conn.recv()
+            if command == "close":
+                break
+            try:
+                if command == "reset":
+                    for index in indices:
+                        reset(index)
+                elif command == "step":
+                    for index in indices:
+                        reward, done, _ = envs[index].play(int(actions_array[index]))
+                        rewards[index] = reward
+                        dones[index] = done
+                        if done:
+                            # Start the next episode right away, with the next seed for this slot.
+                            if seeds[index] >= 0:
+                                seeds[index] += len(seeds)
+                            reset(index)
+                        else:
+                            envs[index].observation(out=observations[index])
+            except Exception:
+                # The games of this worker can't go on, report why to the parent and stop.
+                conn.send(traceback.format_exc())
+                break
+            conn.send(None)  # Acknowledge, the results are already in shared memory.
+    finally:
+        for shm, _ in shared.values():
+            shm.close()
+
+
+class VectorDungeonEnv:
+    """
+    Steps `num_envs` independent games across `processes` worker processes.
+
+    `observations`, `rewards` and `dones` are views on shared memory that the
+    workers write into, they are overwritten by every `reset` and `step`.
+    Finished games are reset automatically with the next seed of their slot.
+    If a game raises in a worker, `reset` and `step` raise a RuntimeError with its traceback.
+    """
+
+    def __init__(self, num_envs: int, processes: Optional[int] = None, max_turns: int = 5000):
+        self.num_envs = num_envs
+        processes = min(processes or multiprocessing.cpu_count(), num_envs)
+
+        specs = {
+            "observations": ((num_envs, *OBSERVATION_SHAPE), np.uint8),
+            "actions": ((num_envs,), np.int64),
+            "rewards": ((num_envs,), np.float32),
+            "dones": ((num_envs,), np.bool_),
+            "seeds": ((num_envs,), np.int64),
+        }
+        self._memory: List[SharedMemory] = []
+        buffers = {}
+        arrays = {}
+        for key, (shape, dtype) in specs.items():
+            shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            self._memory.append(shm)
+            buffers[key] = (shm.name, shape, dtype)
+            arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        self.observations: np.ndarray = arrays["observations"]
+        self._actions: np.ndarray = arrays["actions"]
+        self.rewards: np.ndarray = arrays["rewards"]
+        self.dones: np.ndarray = arrays["dones"]
+        self._seeds: np.ndarray = arrays["seeds"]
+
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        for indices in np.array_split(np.arange(num_envs), processes):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(child_conn, buffers, indices.tolist(), max_turns),
+                daemon=True,
+            )
+            process.start()
+            # Only the worker holds the other end now, so `recv` fails instead of blocking if it dies.
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+
+    def _broadcast(self, command: str) -> None:
+        """Send `command` to every worker and wait for all of them, raising the first error."""
+        for conn in self._connections:
+            try:
+                conn.send(command)
+            except BrokenPipeError:
+                pass    # The worker is gone, `recv` reports it below.
+        errors = []
+        for conn in self._connections:
+            try:
+                error = conn.recv()
+            except (EOFError, OSError):
+                error = "The worker process exited unexpectedly."
+            if error is not None:
+                errors.append(error)
+        if errors:
+            raise RuntimeError(f"A worker process failed:\n{errors[0]}")
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        """Reset every game, slot `i` is seeded with `seed + i` if a seed is given."""
+        self._seeds[:] = -1 if seed is None else np.arange(seed, seed + self.num_envs)
+        self._broadcast("reset")
+        return self.observations
+
+    def step(self, actions_: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Step every game with its action index, returns observations, rewards and dones."""
+        self._actions[:] = actions_
+        self._broadcast("step")
+        return self.observations, self.rewards, self.dones
+
+    def close(self) -> None:
+        for conn in self._connections:
+            try:
+                conn.send("close")
+            except (BrokenPipeError, OSError):
+                pass    # The worker already exited after an error.
+            conn.close()
+        for process in self._processes:
+            process.join()
+        for shm in self._memory:
+            shm.close()
+            shm.unlink()
+        self._connections.clear()
+        self._processes.clear()
+        self._memory.clear()
+
+    def __enter__(self) -> VectorDungeonEnv:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -5,4 +5,8 @@ class Impossible(Exception):
 
 
 class QuitWithoutSaving(SystemExit):
-    """Can be raised to exit the game without automatically saving."""
\ No newline at end of file
+    """Can be raised to exit the game without automatically saving."""
+
+
+class ReplayDesync(Exception):
+    """Raised when playing back a replay doesn't reproduce the recorded game."""
@@ -3,6 +3,8 @@ game_title = "CRYPTS OF THE EMBERED"
 screen_width = 16*4
 screen_height = 16*3
 
+tileset_filename = "resources/terminal16x16_gs_ro.png"
+
 gui_height = 8
 gui_width = screen_width - 12
 level_up_width = 38
@@ -14,9 +16,21 @@ map_height = screen_height - gui_height - 1
 room_max_size = 12
 room_min_size = 6
 max_rooms = 30
+dungeon_generator = "classic"   # One of `pipeline.GENERATORS`: classic, rooms, shaped_rooms, bsp or caves.
 
 MAX_FLOOR = 5
 
+# Debugging.
+debug_keys = False  # Enables F3, F5 and F9, also set by `--debug` / CRYPTS_DEBUG.
+trace_filename = "trace.json"   # Default output of `--trace` / CRYPTS_TRACE.
+profile_turns = 20  # Turns captured by the profiling key.
+snapshot_interval = 10  # Turns between the snapshots kept for rewinding.
+snapshot_capacity = 30  # Snapshots kept, older ones are dropped.
+replay_filename = "replay.rpl"  # Written on exit, play it back with `python -m scripts.replay`.
+
+# Input.
+max_queued_moves = 3    # Movement keys applied per frame, extra key-repeat events are dropped.
+
 number_of_main_menu_chars = 30
 
 # Letters
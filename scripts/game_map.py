@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 
-from typing import Tuple, Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import Dict, List, Tuple, Iterable, Iterator, Optional, TYPE_CHECKING
 
 
 import numpy as np  # type: ignore
@@ -11,6 +11,9 @@ from tcod.console import Console
 
 from scripts.entity import Actor, Item
 import scripts.tile_types
+import scripts.profiling as profiling
+from scripts.actor_table import ActorTable
+from scripts.state_hash import StateHash
 from scripts.color_constants import RGB
 import scripts.color as color
 
@@ -22,6 +25,31 @@ if TYPE_CHECKING:
 
 
 class GameMap:
+    _state_hash: Optional[StateHash] = None
+    _actor_table: Optional[ActorTable] = None
+    # The entities by kind, dicts are used as insertion ordered sets.
+    _live_actors: Optional[Dict[Actor, None]] = None
+    _items: Optional[Dict[Item, None]] = None
+    _corpses: Optional[Dict[Actor, None]] = None
+    # Remains of dead actors, allocated on the first death. The array holds the
+    # topmost look and the total count of each tile, `decal_counts` how many of
+    # each name died there.
+    decals: Optional[np.ndarray] = None
+    decal_names: List[str]
+    decal_counts: Optional[Dict[Tuple[int, int], Dict[int, int]]] = None
+    # The entities on each tile, built on first use.
+    _entity_index: Optional[Dict[Tuple[int, int], Dict[Entity, None]]] = None
+    # Bumped whenever an entity moves or changes, the visible area changes, more
+    # tiles are explored or an actor leaves remains.
+    entity_version = 0
+    visible_version = 0
+    explored_version = 0
+    decal_version = 0
+    # Room placement attempts of procgen, see `RoomPlacer.stats`.
+    room_stats: Optional[Dict[str, float]] = None
+    # Seconds spent in each stage of `pipeline.Pipeline`, None for other generators.
+    generation_times: Optional[Dict[str, float]] = None
+
     def __init__(
         self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
     ):
@@ -47,48 +75,213 @@ class GameMap:
 
         self.initialize_map()
 
+        self._state_hash = StateHash.from_map(self)
+        self._actor_table = ActorTable(entity for entity in self.entities if isinstance(entity, Actor))
+        self.rebuild_collections(self.entities)
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    @property
+    def state_hash(self) -> StateHash:
+        """The incremental hash of this map, built on first use for maps from older saves."""
+        if self._state_hash is None:
+            self._state_hash = StateHash.from_map(self)
+        return self._state_hash
+
+    @property
+    def actor_table(self) -> ActorTable:
+        """The columnar copy of this map's actors, built on first use for maps from older saves."""
+        if self._actor_table is None:
+            self._actor_table = ActorTable(
+                sorted(
+                    (entity for entity in self.entities if isinstance(entity, Actor)),
+                    key=lambda actor: (actor.y, actor.x),
+                )
+            )
+        return self._actor_table
+
+    def rebuild_collections(self, entities: Iterable[Entity]) -> None:
+        """Rebuild the collections of live actors, items and corpses, in the given order."""
+        self._live_actors = {}
+        self._items = {}
+        self._corpses = {}
+        for entity in entities:
+            self._file_entity(entity)
+
+    def _ensure_collections(self) -> None:
+        if self._live_actors is None:
+            # Maps from older saves, use a fixed order so replays stay deterministic.
+            self.rebuild_collections(sorted(self.entities, key=lambda entity: (entity.y, entity.x, entity.name)))
+
+    def _file_entity(self, entity: Entity) -> None:
+        """Put an entity on this map in the collection of its kind."""
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self._corpses.pop(entity, None)
+                self._live_actors[entity] = None
+            else:
+                self._live_actors.pop(entity, None)
+                self._corpses[entity] = None
+        elif isinstance(entity, Item):
+            self._items[entity] = None
+
+    def _unfile_entity(self, entity: Entity) -> None:
+        self._live_actors.pop(entity, None)
+        self._items.pop(entity, None)
+        self._corpses.pop(entity, None)
+
+    @property
+    def entity_index(self) -> Dict[Tuple[int, int], Dict[Entity, None]]:
+        """The entities on each occupied tile, in the order they got there."""
+        if self._entity_index is None:
+            self._entity_index = {}
+            for entity in self.entities:
+                self._entity_index.setdefault((entity.x, entity.y), {})[entity] = None
+        return self._entity_index
+
+    def invalidate_entity_index(self) -> None:
+        """Must be called after entities were moved without the hooks, like restoring a snapshot."""
+        self._entity_index = None
+        self.entity_version += 1
+
+    def entities_at(self, x: int, y: int) -> Iterable[Entity]:
+        return self.entity_index.get((x, y), {}).keys()
+
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map, if it isn't already on it."""
+        if entity not in self.entities:
+            self.entities.add(entity)
+            self._ensure_collections()
+            self._file_entity(entity)
+            if isinstance(entity, Actor):
+                self.actor_table.add(entity)
+            self.entity_changed(entity)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map, if it's on it."""
+        if entity in self.entities:
+            self.entity_changing(entity)
+            self.entities.remove(entity)
+            self._ensure_collections()
+            self._unfile_entity(entity)
+            if isinstance(entity, Actor):
+                self.actor_table.remove(entity)
+            self.entity_version += 1
+
+    def entity_changing(self, entity: Entity) -> None:
+        """Must be called before the position or HP of an entity on this map changes."""
+        if entity in self.entities:
+            self.state_hash.remove(entity)
+            location = (entity.x, entity.y)
+            here = self.entity_index.get(location)
+            if here is not None:
+                here.pop(entity, None)
+                if not here:
+                    del self.entity_index[location]
+
+    def entity_changed(self, entity: Entity) -> None:
+        """Must be called after the position or HP of an entity on this map changed."""
+        if entity in self.entities:
+            self.state_hash.add(entity)
+            self.entity_index.setdefault((entity.x, entity.y), {})[entity] = None
+            self.entity_version += 1
+            if isinstance(entity, Actor):
+                self.actor_table.update(entity)
+
+    def actor_changed(self, actor: Actor) -> None:
+        """Must be called after the stats, AI or looks of an actor on this map changed."""
+        if actor in self.entities:
+            self._ensure_collections()
+            self._file_entity(actor)   # It may have died.
+            self.actor_table.update(actor)
+            self.entity_version += 1
+
     @property
     def actors(self) -> Iterator[Actor]:
-        """Iterate over this maps living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        """Iterate over this maps living actors, in the order they were added."""
+        self._ensure_collections()
+        # Iterate over a copy, actors can die or be removed meanwhile.
+        yield from tuple(self._live_actors)
 
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        """Iterate over the items lying on this map, in the order they were added."""
+        self._ensure_collections()
+        yield from tuple(self._items)
+
+    @property
+    def corpses(self) -> Iterator[Actor]:
+        """Iterate over the dead actors left on this map."""
+        self._ensure_collections()
+        yield from tuple(self._corpses)
         
 
+    def add_corpse(self, actor: Actor) -> None:
+        """
+        Replace a dead actor with a decal on its tile and remove it from this map,
+        so its components can be released. Stacked remains keep the topmost look.
+        """
+        if self.decals is None:
+            self.decals = np.zeros((self.width, self.height), dtype=scripts.tile_types.decal_dt, order="F")
+            self.decal_names = []
+        if self.decal_counts is None:
+            self.decal_counts = {}
+
+        if actor.name not in self.decal_names:
+            self.decal_names.append(actor.name)
+        name = self.decal_names.index(actor.name)
+
+        location = (actor.x, actor.y)
+        counts = self.decal_counts.get(location)
+        if counts is None:
+            counts = self.decal_counts[location] = self._saved_decal_counts(*location)
+        counts[name] = counts.get(name, 0) + 1
+
+        count = self.decals["count"][location]
+        self.decals[location] = (ord(actor.char), actor.color, name, count + 1)
+        self.decal_version += 1
+
+        self.remove_entity(actor)
+
+    def _saved_decal_counts(self, x: int, y: int) -> Dict[int, int]:
+        """The remains of a tile in saves from before `decal_counts`, only the topmost kind was kept."""
+        decal = self.decals[x, y] if self.decals is not None else None
+        if decal is None or not decal["count"]:
+            return {}
+        return {int(decal["name"]): int(decal["count"])}
+
+    def remains_at(self, x: int, y: int) -> Dict[str, int]:
+        """How many of each kind of actor died on a tile, in the order they first died there."""
+        if self.decals is None or not self.decals["count"][x, y]:
+            return {}
+        counts = self.decal_counts.get((x, y)) if self.decal_counts is not None else None
+        if counts is None:
+            counts = self._saved_decal_counts(x, y)
+        return {self.decal_names[name]: count for name, count in counts.items()}
+
     def get_blocking_entity_at_location(
         self, location_x: int, location_y: int
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.entities_at(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
             
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
-
+        """Return the living actor at a location, if any."""
+        for entity in self.entities_at(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
     
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
     
+    @profiling.traced("wall_colors")
     def initialize_map(self) -> None:
         """Generate the map and precompute random wall colors using NumPy."""
         # Create an array to store the RGB color for each tile (width x height x 3 for RGB)
@@ -117,6 +310,7 @@ class GameMap:
         luminance = bg_color.luminance()
         return (210, 210, 210) if luminance < 128 else (20, 20, 20)
             
+    @profiling.timed("render_map")
     def render_map(self, console: Console) -> None:
         """
         Renders the map.
@@ -142,9 +336,14 @@ class GameMap:
             default=scripts.tile_types.SHROUD,
         )
 
+    @profiling.timed("render_entities")
     def render_entities(self, console: Console) -> None:
         """Renders all entities visible to the player."""
-        
+        if self.decals is not None:
+            shown = self.visible & (self.decals["count"] > 0)
+            console.rgb["ch"][0 : self.width, 0 : self.height][shown] = self.decals["ch"][shown]
+            console.rgb["fg"][0 : self.width, 0 : self.height][shown] = self.decals["fg"][shown]
+
         entities_sorted_for_rendering = sorted(
             self.entities, key=lambda x: x.render_order.value
         )
@@ -162,6 +361,9 @@ class GameWorld:
     Holds the settings for the GameMap, and generates new maps when moving down the stairs.
     """
 
+    # Games saved before there was a choice of generators used the classic one.
+    generator = "classic"
+
     def __init__(
         self,
         *,
@@ -171,9 +373,11 @@ class GameWorld:
         max_rooms: int,
         room_min_size: int,
         room_max_size: int,
-        current_floor: int = 0
+        current_floor: int = 0,
+        generator: str = "classic",
     ):
         self.engine = engine
+        self.generator = generator
 
         self.map_width = map_width
         self.map_height = map_height
@@ -186,11 +390,12 @@ class GameWorld:
         self.current_floor = current_floor
 
     def generate_floor(self) -> None:
-        from scripts.procgen import generate_dungeon
+        from scripts.pipeline import generate_dungeon
 
         self.current_floor += 1
 
         self.engine.game_map = generate_dungeon(
+            generator=self.generator,
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
@@ -0,0 +1,73 @@
+"""Render the game into offscreen consoles and NumPy arrays, without opening a window or SDL."""
+from __future__ import annotations
+
+
+from typing import Optional, TYPE_CHECKING, Union
+
+
+import numpy as np  # type: ignore
+import tcod
+from tcod.console import Console
+
+import scripts.color as color
+import scripts.game_data as game_data
+
+
+if TYPE_CHECKING:
+    from scripts.engine import Engine
+    from scripts.input_handlers import BaseEventHandler
+
+
+Renderable = Union["BaseEventHandler", "Engine"]
+
+
+def new_console(
+    width: int = game_data.screen_width, height: int = game_data.screen_height
+) -> Console:
+    """Return an offscreen console laid out like the root console in `main.py`."""
+    return Console(width, height, order="F")
+
+
+def load_tileset() -> tcod.tileset.Tileset:
+    """Load the tileset the game window uses, loading it doesn't need SDL."""
+    return tcod.tileset.load_tilesheet(
+        game_data.tileset_filename, 16, 16, tcod.tileset.CHARMAP_CP437
+    )
+
+
+def render_console(target: Renderable, console: Optional[Console] = None) -> Console:
+    """
+    Render a handler (`on_render`) or an Engine (`render`) onto `console`,
+    cleared the same way the main loop does. A new console is made if none is given.
+    """
+    if console is None:
+        console = new_console()
+
+    console.clear(bg=color.console_bg)
+
+    if hasattr(target, "on_render"):
+        target.on_render(console=console)
+    else:
+        target.render(console)
+
+    return console
+
+
+def render_frame(target: Renderable, console: Optional[Console] = None) -> np.ndarray:
+    """
+    Render a frame and return a copy of `console.rgb`,
+    a (width, height) array with "ch", "fg" and "bg" fields.
+    """
+    return render_console(target, console).rgb.copy()
+
+
+def render_image(
+    target: Renderable,
+    tileset: tcod.tileset.Tileset,
+    console: Optional[Console] = None,
+) -> np.ndarray:
+    """
+    Render a frame and rasterize it with `tileset`.
+    Returns a (height * tile_height, width * tile_width, 3) uint8 RGB image.
+    """
+    return tileset.render(render_console(target, console))[:, :, :3]
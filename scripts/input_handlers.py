@@ -4,11 +4,10 @@ from __future__ import annotations
 import os
 
 
-from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING, Union
 
 import tcod.event
 from tcod import libtcodpy
-import math
 
 import tcod.libtcodpy
 
@@ -26,6 +25,9 @@ from scripts.actions import (
 import scripts.color as color
 import scripts.exceptions as exceptions
 import scripts.game_data as game_data
+import scripts.profiling as profiling
+import scripts.replay as replay
+import scripts.spatial as spatial
 #from scripts.setup_game import new_game
 
 
@@ -86,6 +88,11 @@ PICK_UP_KEYS = {
 LOOK_KEYS = {
     tcod.event.KeySym.KP_DIVIDE,
 }
+DEBUG_KEYS = {
+    "STATS_OVERLAY": tcod.event.KeySym.F3,
+    "PROFILE_TURNS": tcod.event.KeySym.F5,
+    "REWIND": tcod.event.KeySym.F9,
+}
 MODIFIER_KEYS = {
     "LSHIFT": tcod.event.Modifier.LSHIFT,
     "RSHIFT": tcod.event.Modifier.RSHIFT,
@@ -107,6 +114,45 @@ MainGameEventHandler will become the active handler.
 # Colorama
 #init()
 
+
+def coalesce_events(
+    events: Iterable[tcod.event.Event],
+    max_moves: int,
+    current_handler: Callable[[], BaseEventHandler],
+) -> Iterator[tcod.event.Event]:
+    """Reduce a burst of queued events to the ones worth handling before the next frame.
+
+    Only the last `MouseMotion` is kept, since it overwrites the earlier ones anyway.
+    Movement keys are kept in order and each one becomes a turn, but only up to
+    `max_moves` of them, so a held key stops moving the player as soon as it's released.
+
+    The cap only applies while `current_handler()` is the main game handler, it's
+    checked as each event is yielded since handling one can switch handlers.
+    Elsewhere the movement keys are letters typed in menus and are all kept.
+    """
+    events = list(events)
+
+    last_motion = None
+    for index, event in enumerate(events):
+        if isinstance(event, tcod.event.MouseMotion):
+            last_motion = index
+
+    moves = 0
+
+    for index, event in enumerate(events):
+        if isinstance(event, tcod.event.MouseMotion) and index != last_motion:
+            continue
+        if (
+            isinstance(event, tcod.event.KeyDown)
+            and event.sym in MOVE_KEYS
+            and isinstance(current_handler(), MainGameEventHandler)
+        ):
+            moves += 1
+            if moves > max_moves:
+                continue
+        yield event
+
+
 class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next active event handler."""
@@ -134,6 +180,7 @@ class EventHandler(BaseEventHandler):
             return action_or_state
         if self.handle_action(action_or_state):
             # A valid action was performed.
+            self.end_profiled_turn()
             if self.engine.amulet_picked:
                 return GameWonEventHandler(self.engine)
             if not self.engine.player.is_alive:
@@ -146,6 +193,8 @@ class EventHandler(BaseEventHandler):
             return MainGameEventHandler(self.engine)    # Return to the main handler.
         return self
 
+    @profiling.timed("handle_action")
+    @profiling.profiled
     def handle_action(self, action: Optional[Action]) -> bool:
         """Handle actions returned from event methods.
 
@@ -154,8 +203,14 @@ class EventHandler(BaseEventHandler):
         if action is None:
             return False
 
+        replay_log = self.engine.replay
+        if replay_log is not None:
+            # Encode before performing it, using an item can remove it from the inventory.
+            entry = replay.encode_action(action)
+
         try:
-            action.perform()
+            with profiling.span(type(action).__name__):
+                action.perform()
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  # Skip enemy turn on exceptions.
@@ -163,8 +218,27 @@ class EventHandler(BaseEventHandler):
         self.engine.handle_enemy_turns()
 
         self.engine.update_fov()
+
+        if replay_log is not None:
+            replay_log.record(entry, self.engine)
+        if game_data.debug_keys:
+            # Snapshots are only needed for the rewind key.
+            self.engine.snapshots.tick(self.engine)
         return True
 
+    def end_profiled_turn(self) -> None:
+        """Count the turn for the profiler and report its results once it's done."""
+        report = profiling.turn_profiler.end_turn()
+        if report is None:
+            return
+
+        filename, summary = report
+        self.engine.message_log.add_message(
+            self.engine.translation.translate("profile_saved", filename=filename), color.lightgrey
+        )
+        for line in summary:
+            self.engine.message_log.add_message(line, color.lightgrey, stack=False)
+
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
         if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
             self.engine.mouse_location = event.tile.x, event.tile.y
@@ -378,6 +452,8 @@ class LevelUpEventHandler(AskUserEventHandler):
                     player.level.increase_power()
                 case 2:
                     player.level.increase_defense()
+            if self.engine.replay is not None:
+                self.engine.replay.record_level_up(index, self.engine)
         else:
             self.engine.message_log.add_message(
                 self.engine.translation.translate("invalid_key"), color.invalid
@@ -660,14 +736,18 @@ class AreaRangedAttackHandler(SelectIndexHandler):
             radius: int,
             bg_color: Tuple[int, int, int],
     ):
-        for x in range(center_x - radius, center_x + radius + 1):
-            for y in range(center_y - radius, center_y + radius + 1):
-                # Calculate the distance from the center to the current tile
-                distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-            
-                # Change the background color if the distance is within the radius
-                if distance <= radius and self.engine.game_map.in_bounds(x, y):
-                    console.rgb["bg"][x, y] = bg_color
+        # The same mask the fireball hits with, so the preview matches the damage area.
+        mask = spatial.disk_mask(radius)
+        game_map = self.engine.game_map
+
+        # Clip the mask's square to the map.
+        left, top = center_x - radius, center_y - radius
+        x1, x2 = max(left, 0), min(center_x + radius + 1, game_map.width)
+        y1, y2 = max(top, 0), min(center_y + radius + 1, game_map.height)
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        console.rgb["bg"][x1:x2, y1:y2][mask[x1 - left : x2 - left, y1 - top : y2 - top]] = bg_color
                     
 
 class MainGameEventHandler(EventHandler):
@@ -707,9 +787,32 @@ class MainGameEventHandler(EventHandler):
             return CharacterScreenEventHandler(self.engine)
         elif key in LOOK_KEYS:
             return LookHandler(self.engine)
+        elif key in DEBUG_KEYS.values() and game_data.debug_keys:
+            self.handle_debug_key(key)
 
         return action
 
+    def handle_debug_key(self, key: tcod.event.KeySym) -> None:
+        """The keys for developers, only active with `game_data.debug_keys`."""
+        if key == DEBUG_KEYS["STATS_OVERLAY"]:
+            profiling.stats.toggle()
+        elif key == DEBUG_KEYS["PROFILE_TURNS"] and not profiling.turn_profiler.active:
+            profiling.turn_profiler.start(game_data.profile_turns)
+            self.engine.message_log.add_message(
+                self.engine.translation.translate("profile_start", turns=game_data.profile_turns),
+                color.lightgrey,
+            )
+        elif key == DEBUG_KEYS["REWIND"]:
+            turn = self.engine.snapshots.rewind(self.engine)
+            if turn is None:
+                self.engine.message_log.add_message(
+                    self.engine.translation.translate("rewind_none"), color.impossible
+                )
+            else:
+                self.engine.message_log.add_message(
+                    self.engine.translation.translate("rewind", turn=turn), color.lightgrey
+                )
+
 
 
 class GameWonEventHandler(EventHandler):
@@ -5,6 +5,7 @@ import tcod
 import textwrap
 
 import scripts.color as color
+import scripts.profiling as profiling
 
 
 class Message:
@@ -38,6 +39,7 @@ class MessageLog:
         else:
             self.messages.append(Message(text, fg))
 
+    @profiling.timed("message_log")
     def render(
         self, console: tcod.console.Console, x: int, y: int, width: int, height: int,
     ) -> None:
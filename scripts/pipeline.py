@@ -0,0 +1,403 @@
+"""
+Staged dungeon generation: layout -> carve -> connect -> decorate -> populate.
+
+A layout strategy decides where the rooms are, every other stage is shared:
+carving digs the rooms out, connecting digs L-shaped tunnels between
+consecutive rooms and walls up whatever they left unreachable, decorating
+places the player and the stairs and populating spawns the monsters and
+items of each room. Every stage is timed, the times
+end up in `GameMap.generation_times` and in the trace.
+
+The "classic" generator is `procgen.generate_dungeon` as it always was, its
+draws from the RNG are interleaved across stages, so it's kept as is to make
+the same dungeons for the same seeds, replays depend on it.
+"""
+from __future__ import annotations
+
+
+import contextlib
+import functools
+import math
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+
+import numpy as np  # type: ignore
+
+import scripts.entity_factories as entity_factories
+import scripts.procgen as procgen
+import scripts.profiling as profiling
+import scripts.tile_types as tile_types
+from scripts.game_map import GameMap
+from scripts.procgen import CircularRoom, ElipticalRoom, RectangularRoom, Room, RoomPlacer
+
+
+if TYPE_CHECKING:
+    from scripts.engine import Engine
+
+
+# "map" is making the empty GameMap, with its wall colors.
+STAGES = ("map", "layout", "carve", "connect", "decorate", "populate")
+
+
+class CaveRegion(Room):
+    """A connected area of cave floor, its bounds are its bounding box plus the walls around it."""
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, spawn_area: int = 64):
+        super().__init__(x1=int(x.min()) - 1, y1=int(y.min()) - 1, x2=int(x.max()) + 1, y2=int(y.max()) + 1)
+        self.x = x
+        self.y = y
+        # Populated about as densely as rooms of `spawn_area` tiles.
+        self.spawn_rolls = max(1, round(len(x) / spawn_area))
+        # The floor tile closest to the middle of the region, the box's center may be a wall.
+        closest = int(np.argmin((x - x.mean()) ** 2 + (y - y.mean()) ** 2))
+        self._center = int(x[closest]), int(y[closest])
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return self._center
+
+    @property
+    def inner(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.x, self.y
+
+
+class Layout(ABC):
+    """A layout strategy: decides the rooms of a floor, in the order they're connected."""
+
+    def __init__(self) -> None:
+        self.stats: Optional[Dict[str, float]] = None
+
+    @abstractmethod
+    def rooms(self, width: int, height: int) -> List[Room]:
+        raise NotImplementedError()
+
+
+class RoomsLayout(Layout):
+    """Rooms of random sizes at random places, dropping the ones that overlap."""
+
+    def __init__(
+        self, max_rooms: int, room_min_size: int, room_max_size: int, shapes: Tuple[str, ...] = ("rectangle",)
+    ):
+        super().__init__()
+        self.max_rooms = max_rooms
+        self.room_min_size = room_min_size
+        self.room_max_size = room_max_size
+        self.shapes = shapes
+
+    def new_room(self, shape: str, width: int, height: int) -> Room:
+        room_width = random.randint(self.room_min_size, self.room_max_size)
+        room_height = random.randint(self.room_min_size, self.room_max_size)
+        if shape == "circle":
+            room_width = room_height = min(room_width, room_height) // 2 * 2
+        x = random.randint(0, width - room_width - 1)
+        y = random.randint(0, height - room_height - 1)
+        if shape == "circle":
+            return CircularRoom(x, y, room_width // 2)
+        if shape == "ellipse":
+            return ElipticalRoom(x, y, room_width, room_height)
+        return RectangularRoom(x, y, room_width, room_height)
+
+    def rooms(self, width: int, height: int) -> List[Room]:
+        placer = RoomPlacer(width, height)
+        rooms: List[Room] = []
+        for _ in range(self.max_rooms):
+            shape = random.choice(self.shapes) if len(self.shapes) > 1 else self.shapes[0]
+            room = self.new_room(shape, width, height)
+            if placer.try_place(room):
+                rooms.append(room)
+        self.stats = placer.stats
+        return rooms
+
+
+class BSPLayout(Layout):
+    """
+    Binary space partitioning: split the map in two until the parts are small,
+    then put one room in each part. Rooms never overlap and spread over the whole map.
+    """
+
+    def __init__(self, room_min_size: int, room_max_size: int, max_depth: int = 8):
+        super().__init__()
+        self.room_min_size = room_min_size
+        self.room_max_size = room_max_size
+        self.max_depth = max_depth
+
+    def split(
+        self, x: int, y: int, width: int, height: int, depth: int, leaves: List[Tuple[int, int, int, int]]
+    ) -> None:
+        # A part must hold the smallest room and its walls.
+        min_size = self.room_min_size + 2
+        can_split_x = width >= 2 * min_size
+        can_split_y = height >= 2 * min_size
+        if depth == 0 or not (can_split_x or can_split_y):
+            leaves.append((x, y, width, height))
+            return
+        # Split across the longer side, so parts don't get too thin.
+        if can_split_x and can_split_y:
+            split_x = width > height * 1.25 or (height <= width * 1.25 and random.random() < 0.5)
+        else:
+            split_x = can_split_x
+        if split_x:
+            at = random.randint(min_size, width - min_size)
+            self.split(x, y, at, height, depth - 1, leaves)
+            self.split(x + at, y, width - at, height, depth - 1, leaves)
+        else:
+            at = random.randint(min_size, height - min_size)
+            self.split(x, y, width, at, depth - 1, leaves)
+            self.split(x, y + at, width, height - at, depth - 1, leaves)
+
+    def rooms(self, width: int, height: int) -> List[Room]:
+        leaves: List[Tuple[int, int, int, int]] = []
+        self.split(0, 0, width, height, self.max_depth, leaves)
+        rooms: List[Room] = []
+        for x, y, leaf_width, leaf_height in leaves:
+            room_width = random.randint(self.room_min_size, min(self.room_max_size, leaf_width - 1))
+            room_height = random.randint(self.room_min_size, min(self.room_max_size, leaf_height - 1))
+            rooms.append(RectangularRoom(
+                random.randint(x, x + leaf_width - 1 - room_width),
+                random.randint(y, y + leaf_height - 1 - room_height),
+                room_width,
+                room_height,
+            ))
+        self.stats = {"leaves": len(leaves)}
+        return rooms
+
+
+class CaveLayout(Layout):
+    """
+    Cellular automata caves: start from random noise and smooth it, a tile becomes
+    a wall when enough of its 8 neighbours are walls. Each connected area of floor
+    big enough is a room, smaller pockets stay wall.
+
+    If the noise smooths into no room at all, it's drawn again up to `attempts`
+    times, then the `fallback` layout makes the floor instead.
+    """
+
+    def __init__(
+        self,
+        fill: float = 0.45,
+        iterations: int = 4,
+        birth: int = 5,
+        survival: int = 4,
+        min_region: int = 16,
+        attempts: int = 10,
+        fallback: Optional[Layout] = None,
+    ):
+        super().__init__()
+        self.fill = fill
+        self.iterations = iterations
+        self.birth = birth
+        self.survival = survival
+        self.min_region = min_region
+        self.attempts = attempts
+        self.fallback = fallback
+
+    @staticmethod
+    def wall_neighbours(walls: np.ndarray) -> np.ndarray:
+        """Count the walls around each tile, a 3x3 convolution, outside the map counts as wall."""
+        padded = np.pad(walls, 1, constant_values=True).astype(np.int8)
+        width, height = walls.shape
+        counts = np.zeros(walls.shape, dtype=np.int8)
+        for dx in range(3):
+            for dy in range(3):
+                if (dx, dy) != (1, 1):
+                    counts += padded[dx:dx + width, dy:dy + height]
+        return counts
+
+    def smooth(self, walls: np.ndarray) -> np.ndarray:
+        for _ in range(self.iterations):
+            neighbours = self.wall_neighbours(walls)
+            walls = np.where(walls, neighbours >= self.survival, neighbours >= self.birth)
+        return walls
+
+    @staticmethod
+    def regions(floor: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """The 4-connected areas of `floor`, as (x, y) index arrays."""
+        labels = np.zeros(floor.shape, dtype=np.int32)
+        width, height = floor.shape
+        regions = []
+        for start in zip(*np.nonzero(floor)):
+            if labels[start]:
+                continue
+            label = len(regions) + 1
+            labels[start] = label
+            tiles = [start]
+            queue = deque([start])
+            while queue:
+                x, y = queue.popleft()
+                for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if 0 <= nx < width and 0 <= ny < height and floor[nx, ny] and not labels[nx, ny]:
+                        labels[nx, ny] = label
+                        tiles.append((nx, ny))
+                        queue.append((nx, ny))
+            x, y = np.array(tiles).T
+            regions.append((x, y))
+        return regions
+
+    def cave(self, width: int, height: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Draw and smooth one cave, returns its regions big enough to be rooms."""
+        walls = np.random.random((width, height)) < self.fill
+        walls = self.smooth(walls)
+        # Keep a wall all around the map.
+        walls[[0, -1], :] = True
+        walls[:, [0, -1]] = True
+        return [region for region in self.regions(~walls) if len(region[0]) >= self.min_region]
+
+    def rooms(self, width: int, height: int) -> List[Room]:
+        for attempt in range(1, self.attempts + 1):
+            regions = self.cave(width, height)
+            if regions:
+                break
+        else:
+            if self.fallback is None:
+                return []
+            rooms = self.fallback.rooms(width, height)
+            self.stats = {**(self.fallback.stats or {}), "cave_attempts": self.attempts, "fallback": 1}
+            return rooms
+        rooms: List[Room] = [CaveRegion(x, y) for x, y in regions]
+        # Connecting them from left to right keeps the tunnels short.
+        rooms.sort(key=lambda room: room.center)
+        self.stats = {"cave_attempts": attempt, "regions": len(rooms), "floor": int(sum(len(x) for x, _ in regions))}
+        return rooms
+
+
+def reachable(walkable: np.ndarray, start: Tuple[int, int]) -> np.ndarray:
+    """The tiles of `walkable` that can be walked to from `start`, diagonals included."""
+    seen = np.zeros(walkable.shape, dtype=bool)
+    width, height = walkable.shape
+    seen[start] = True
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for nx in (x - 1, x, x + 1):
+            for ny in (y - 1, y, y + 1):
+                if 0 <= nx < width and 0 <= ny < height and walkable[nx, ny] and not seen[nx, ny]:
+                    seen[nx, ny] = True
+                    queue.append((nx, ny))
+    return seen
+
+
+@contextlib.contextmanager
+def _stage(name: str, times: Dict[str, float]) -> Iterator[None]:
+    """Time a stage into `times`, and into the trace when tracing."""
+    with profiling.span(f"procgen.{name}"):
+        start = time.perf_counter()
+        yield
+        times[name] = time.perf_counter() - start
+
+
+class Pipeline:
+    """Generates floors by running the stages in order with a layout strategy."""
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+
+    def generate(self, map_width: int, map_height: int, engine: Engine) -> GameMap:
+        player = engine.player
+        floor_number = engine.game_world.current_floor
+        times: Dict[str, float] = {}
+        stage = functools.partial(_stage, times=times)
+
+        with stage("map"):
+            dungeon = GameMap(engine, map_width, map_height, entities=[player])
+
+        with stage("layout"):
+            rooms = self.layout.rooms(map_width, map_height)
+        if not rooms:
+            raise ValueError(f"The {type(self.layout).__name__} didn't make any room.")
+
+        with stage("carve"):
+            for room in rooms:
+                dungeon.tiles[room.inner] = tile_types.floor
+
+        with stage("connect"):
+            for previous, room in zip(rooms, rooms[1:]):
+                for x, y in procgen.tunnel_between(previous.center, room.center):
+                    dungeon.tiles[x, y] = tile_types.floor
+            # Wall up any pocket the tunnels missed, so nothing spawns out of reach.
+            walkable = dungeon.tiles["walkable"]
+            dungeon.tiles[walkable & ~reachable(walkable, rooms[0].center)] = tile_types.wall
+
+        with stage("decorate"):
+            player.place(*rooms[0].center, dungeon)
+            stairs = rooms[-1].center if len(rooms) > 1 else self.farthest_floor(dungeon, rooms[0])
+            dungeon.tiles[stairs] = tile_types.down_stairs
+            dungeon.downstairs_location = stairs
+
+        with stage("populate"):
+            for room in rooms:
+                for _ in range(room.spawn_rolls):
+                    procgen.place_entities(room, dungeon, floor_number)
+            if dungeon.amulet_placed and not any(item.yendor for item in dungeon.items):
+                # Its spot was a wall or already taken, it must not be lost.
+                self.place_amulet(dungeon, rooms[-1])
+
+        dungeon.state_hash.update_tiles(dungeon.tiles)
+        dungeon.room_stats = self.layout.stats
+        dungeon.generation_times = times
+        return dungeon
+
+    @staticmethod
+    def place_amulet(dungeon: GameMap, room: Room) -> None:
+        """Spawn the Amulet of Yendor on a free floor tile of `room`, or of the whole floor if it has none."""
+        area = np.zeros(dungeon.tiles.shape, dtype=bool)
+        area[room.inner] = True
+        for tiles in (area & dungeon.tiles["walkable"], dungeon.tiles["walkable"]):
+            free = [
+                (int(x), int(y)) for x, y in zip(*np.nonzero(tiles)) if not dungeon.entities_at(x, y)
+            ]
+            if free:
+                entity_factories.amulet_of_yendor.spawn(dungeon, *random.choice(free))
+                return
+
+    @staticmethod
+    def farthest_floor(dungeon: GameMap, room: Room) -> Tuple[int, int]:
+        """The floor tile farthest from the center of `room`, for the stairs of a floor with only that room."""
+        x, y = np.nonzero(dungeon.tiles["walkable"])
+        cx, cy = room.center
+        farthest = int(np.argmax((x - cx) ** 2 + (y - cy) ** 2))
+        return int(x[farthest]), int(y[farthest])
+
+
+LAYOUTS: Dict[str, Callable[[int, int, int], Layout]] = {
+    "rooms": lambda max_rooms, room_min_size, room_max_size: RoomsLayout(max_rooms, room_min_size, room_max_size),
+    "shaped_rooms": lambda max_rooms, room_min_size, room_max_size: RoomsLayout(
+        max_rooms, room_min_size, room_max_size, shapes=("rectangle", "circle", "ellipse")
+    ),
+    "bsp": lambda max_rooms, room_min_size, room_max_size: BSPLayout(
+        room_min_size, room_max_size, max_depth=max(1, math.ceil(math.log2(max(max_rooms, 2))))
+    ),
+    "caves": lambda max_rooms, room_min_size, room_max_size: CaveLayout(
+        fallback=RoomsLayout(max_rooms, room_min_size, room_max_size)
+    ),
+}
+
+GENERATORS = ("classic", *LAYOUTS)
+
+
+def generate_dungeon(
+    generator: str,
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    engine: Engine,
+) -> GameMap:
+    """Generate a new dungeon map with one of the `GENERATORS`."""
+    if generator == "classic":
+        return procgen.generate_dungeon(
+            max_rooms=max_rooms,
+            room_min_size=room_min_size,
+            room_max_size=room_max_size,
+            map_width=map_width,
+            map_height=map_height,
+            engine=engine,
+        )
+    if generator not in LAYOUTS:
+        raise ValueError(f"Unknown dungeon generator: {generator!r}.")
+    layout = LAYOUTS[generator](max_rooms, room_min_size, room_max_size)
+    return Pipeline(layout).generate(map_width, map_height, engine)
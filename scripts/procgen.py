@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import bisect
+import functools
+import itertools
+import operator
 import random
 from typing import Optional, Dict, Iterator, List, Tuple, TYPE_CHECKING
 from abc import ABC, abstractmethod
@@ -11,6 +15,8 @@ from scripts.game_data import MAX_FLOOR
 import scripts.entity_factories as entity_factories
 from scripts.game_map import GameMap
 import scripts.tile_types as tile_types
+import scripts.profiling as profiling
+import scripts.spatial as spatial
 
 
 if TYPE_CHECKING:
@@ -47,51 +53,89 @@ enemy_chances: Dict[int, List[Tuple[Entity, int]]] = {
 def get_max_value_for_floor(
         max_value_by_floor: List[Tuple[int, int]], floor: int
 ) -> int:
-    current_value = 0
+    """Return the value of the last entry whose floor minimum is at most `floor`, entries are sorted by floor."""
+    index = bisect.bisect_right(max_value_by_floor, floor, key=operator.itemgetter(0))
+    return max_value_by_floor[index - 1][1] if index else 0
+
+
+class SpawnTable:
+    """
+    The entities a chance table can spawn on a floor, with their cumulative
+    weights, so choosing one is a bisection instead of rebuilding the table.
+    """
+
+    def __init__(
+        self,
+        weighted_chance_by_floor: Dict[int, List[Tuple[Entity, int]]],
+        floor: int,
+        exclude: Tuple[Entity, ...] = (),
+    ):
+        self.source = weighted_chance_by_floor
+        entity_weighted_chances: Dict[Entity, int] = {}
+
+        for key, values in weighted_chance_by_floor.items():
+            if key > floor:
+                break
+            for entity, weighted_chance in values:
+                if entity not in exclude:
+                    entity_weighted_chances[entity] = weighted_chance
 
-    for floor_minimum, value in max_value_by_floor:
-        if floor_minimum > floor:
-            break
-        else:
-            current_value = value
+        self.entities = list(entity_weighted_chances.keys())
+        self.cum_weights = list(itertools.accumulate(entity_weighted_chances.values()))
+        self.total = self.cum_weights[-1] + 0.0 if self.cum_weights else 0.0
 
-    return current_value
+    def choose(self, number_of_entities: int) -> List[Entity]:
+        """
+        Draw `number_of_entities` entities. Makes the same draws as `random.choices`
+        with the plain weights, so a seed still generates the same dungeon.
+        """
+        entities, cum_weights, total = self.entities, self.cum_weights, self.total
+        if not entities:
+            raise IndexError("Can't choose from an empty spawn table.")
+        hi = len(entities) - 1
+        return [
+            entities[bisect.bisect(cum_weights, random.random() * total, 0, hi)]
+            for _ in range(number_of_entities)
+        ]
 
 
-def get_entities_at_random(
+_spawn_tables: Dict[Tuple[int, int, Tuple[int, ...]], SpawnTable] = {}
+
+
+def get_spawn_table(
     weighted_chance_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int,
     floor: int,
-    exclude: Optional[List[Entity]] = None,
-) -> List[Entity]:
-    entity_weighted_chances = {}
+    exclude: Tuple[Entity, ...] = (),
+) -> SpawnTable:
+    """Return the compiled spawn table for a floor, compiling it the first time."""
+    key = (id(weighted_chance_by_floor), floor, tuple(map(id, exclude)))
+    table = _spawn_tables.get(key)
+    if table is None or table.source is not weighted_chance_by_floor:
+        table = _spawn_tables[key] = SpawnTable(weighted_chance_by_floor, floor, exclude)
+    return table
 
-    if exclude is None:
-        exclude = []
 
-    for key, values in weighted_chance_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                if entity not in exclude:
-                    weighted_chance = value[1]
-
-                    entity_weighted_chances[entity] = weighted_chance
+def clear_spawn_tables() -> None:
+    """Forget the compiled spawn tables, needed after changing a chance table in place."""
+    _spawn_tables.clear()
 
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
 
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
+def get_entities_at_random(
+    weighted_chance_by_floor: Dict[int, List[Tuple[Entity, int]]],
+    number_of_entities: int,
+    floor: int,
+    exclude: Optional[List[Entity]] = None,
+) -> List[Entity]:
+    return get_spawn_table(weighted_chance_by_floor, floor, tuple(exclude) if exclude else ()).choose(
+        number_of_entities
     )
 
-    return chosen_entities
-
 
 # Base Room.
 class Room:
+    # How many times the room is populated, big rooms like caves get more than one.
+    spawn_rolls = 1
+
     def __init__(self, x1: int, y1: int, x2: int, y2: int):
         self.x1 = x1
         self.y1 = y1
@@ -134,27 +178,38 @@ class RectangularRoom(Room):
         return slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2)
 
 
-# TODO: Base Circular Room
+@functools.lru_cache(maxsize=None)
+def ellipse_mask(width: int, height: int) -> np.ndarray:
+    """
+    The tiles of the ellipse inscribed in a `width` x `height` box, indexed by
+    [x, y] from the corner of the box. Shared, don't modify it.
+    """
+    x = (np.arange(width) - (width - 1) / 2) / (width / 2)
+    y = (np.arange(height) - (height - 1) / 2) / (height / 2)
+    mask = x[:, np.newaxis] ** 2 + y[np.newaxis, :] ** 2 <= 1
+    mask.flags.writeable = False
+    return mask
+
+
+# Circular Room, (x, y) is the corner of its bounding box.
 class CircularRoom(Room):
-    def __init__(self, x, y, radius):
-        super().__init__(x1=x, y1=y, x2=x+radius, y2=y+radius)
+    def __init__(self, x: int, y: int, radius: int):
+        super().__init__(x1=x, y1=y, x2=x + 2 * radius, y2=y + 2 * radius)
         self.radius = radius
-        self.cx, self.cy = super().center
+        self.cx, self.cy = self.center
 
     @property
     def inner(self) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Return the inner area of this room as the exact circular area.
+        Return the inner area of this room as the exact circular area,
+        a tuple of two numpy arrays: (x_indices, y_indices).
         """
-        y, x = np.mgrid[self.y1:self.y2+1, self.x1:self.x2+1]
-
-        # Circle equation
-        circle_mask = ((x - self.cx) ** 2 + (y - self.cy) ** 2) <= self.radius ** 2
-
-        return np.where(circle_mask)
+        # The disk is a tile smaller than the box, the box's border is the wall.
+        x, y = np.nonzero(spatial.disk_mask(self.radius - 1))
+        return x + self.x1 + 1, y + self.y1 + 1
 
 
-# TODO: Basic Eliptical Room
+# Eliptical Room
 class ElipticalRoom(Room):
     def __init__(self, x: int, y: int, width: int, height: int):
         super().__init__(x1=x, y1=y, x2=x + width, y2=y + height)
@@ -169,14 +224,56 @@ class ElipticalRoom(Room):
         Return the inner area of this room as the exact ellipse-shaped area.
         This returns a tuple of two numpy arrays: (x_indices, y_indices).
         """
-        y, x = np.mgrid[self.y1:self.y2+1, self.x1:self.x2+1]
-        ellipse_mask = (((x - self.cx) ** 2) / (self.radius_x ** 2) +
-                        ((y - self.cy) ** 2) / (self.radius_y ** 2)) <= 1
-        return np.where(ellipse_mask)
+        x, y = np.nonzero(ellipse_mask(self.x2 - self.x1 - 1, self.y2 - self.y1 - 1))
+        return x + self.x1 + 1, y + self.y1 + 1
+
+
+class RoomPlacer:
+    """
+    Occupancy bitmap of the rooms placed so far, walls included, so testing a new
+    room costs its area instead of a comparison with every other room.
+    Also counts the attempts, to tune `max_rooms` and the room sizes.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.occupied = np.zeros((width, height), dtype=bool, order="F")
+        self.attempts = 0
+        self.accepted = 0
+
+    @property
+    def rejected(self) -> int:
+        return self.attempts - self.accepted
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.attempts if self.attempts else 0.0
+
+    def try_place(self, room: Room) -> bool:
+        """
+        Claim the area of `room` and return True if it doesn't overlap any placed room.
+        Bounds are inclusive, like `Room.intersects`, so rooms can't share walls.
+        """
+        self.attempts += 1
+        area = slice(room.x1, room.x2 + 1), slice(room.y1, room.y2 + 1)
+        if self.occupied[area].any():
+            return False
+        self.occupied[area] = True
+        self.accepted += 1
+        return True
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {
+            "attempts": self.attempts,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "acceptance_rate": self.acceptance_rate,
+        }
 
 
+@profiling.traced("place_entities")
 def place_entities(
-        room: RectangularRoom, dungeon: GameMap, floor_number: int
+        room: Room, dungeon: GameMap, floor_number: int
 ) -> None:
     number_of_monsters = random.randint(
         0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
@@ -202,7 +299,8 @@ def place_entities(
         x = random.randint(room.x1 + 1, room.x2 - 1)
         y = random.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+        # Rooms that aren't rectangles have walls inside their bounds.
+        if dungeon.tiles["walkable"][x, y] and not dungeon.entities_at(x, y):
             entity.spawn(dungeon, x, y)
 
 def tunnel_between(
@@ -225,6 +323,7 @@ def tunnel_between(
         yield x, y
 
 
+@profiling.traced("generate_dungeon")
 def generate_dungeon(
     max_rooms: int,
     room_min_size: int,
@@ -238,6 +337,7 @@ def generate_dungeon(
     dungeon = GameMap(engine, map_width, map_height, entities=[player])
 
     rooms: List[RectangularRoom] = []
+    placer = RoomPlacer(dungeon.width, dungeon.height)
 
     center_of_last_room = (0, 0)
 
@@ -251,8 +351,8 @@ def generate_dungeon(
         # "RectangularRoom" class makes rectangles easier to work with
         new_room = RectangularRoom(x, y, room_width, room_height)
 
-        # Run through the other rooms and see if they intersect with this one.
-        if any(new_room.intersects(other_room) for other_room in rooms):
+        # Check the area of the other rooms to see if they intersect with this one.
+        if not placer.try_place(new_room):
             continue  # This room intersects, so go to the next attempt.
         # If there are no intersections then the room is valid.
 
@@ -275,6 +375,9 @@ def generate_dungeon(
 
         # Finally, append the new room to the list.
         rooms.append(new_room)
-    
+
+    dungeon.state_hash.update_tiles(dungeon.tiles)
+    dungeon.room_stats = placer.stats
+
     return dungeon
 
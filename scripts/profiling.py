@@ -0,0 +1,297 @@
+"""Lightweight timing of the game's hot paths, to diagnose slow floors in the field."""
+from __future__ import annotations
+
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, ContextManager, Deque, Dict, List, Optional, Tuple, TypeVar
+
+
+import numpy as np  # type: ignore
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class FrameStats:
+    """
+    Keeps the last `window` timings (in seconds) and net allocated blocks
+    for every measured section, so rolling percentiles can be shown on screen.
+    """
+
+    def __init__(self, window: int = 120):
+        self.enabled = False
+        self.window = window
+        self.timings: Dict[str, Deque[float]] = {}
+        self.allocations: Dict[str, Deque[int]] = {}
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        if not self.enabled:
+            # Don't mix old samples with the next session.
+            self.timings.clear()
+            self.allocations.clear()
+
+    def record(self, label: str, elapsed: float, allocated: int) -> None:
+        if label not in self.timings:
+            self.timings[label] = deque(maxlen=self.window)
+            self.allocations[label] = deque(maxlen=self.window)
+        self.timings[label].append(elapsed)
+        self.allocations[label].append(allocated)
+
+    def percentiles(self, label: str) -> Tuple[float, float, float]:
+        """Return the p50, p95 and p99 of a section, in milliseconds."""
+        p50, p95, p99 = np.percentile(self.timings[label], [50, 95, 99]) * 1000
+        return p50, p95, p99
+
+    def lines(self) -> List[str]:
+        """Return one formatted line per measured section."""
+        lines = []
+        for label in self.timings:
+            p50, p95, p99 = self.percentiles(label)
+            allocated = int(np.mean(self.allocations[label]))
+            lines.append(
+                f"{label:<16}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f}{allocated:>+8}"
+            )
+        return lines
+
+
+class Tracer:
+    """
+    Collects complete ("X") events in the Chrome trace event format, so a session
+    can be opened in chrome://tracing or https://ui.perfetto.dev as a timeline.
+
+    After `max_events` further events are dropped, the written trace then ends
+    with a "trace truncated" instant event at the first dropped one.
+    """
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.max_events = max_events
+        self.events: List[Dict[str, Any]] = []
+        self.origin = time.perf_counter()
+        self.dropped = 0
+        self.first_dropped = 0.0
+
+    def begin(self, path: str) -> None:
+        """Start tracing, the trace is written to `path` when the game exits."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self.path = path
+        self.origin = time.perf_counter()
+        atexit.register(self.write)
+
+    def add(
+        self, name: str, start: float, elapsed: float, args: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if len(self.events) >= self.max_events:
+            if not self.dropped:
+                self.first_dropped = start
+                print(
+                    f"The trace reached {self.max_events} events, later ones are dropped.",
+                    file=sys.stderr,
+                )
+            self.dropped += 1
+            return
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.origin) * 1_000_000,   # Microseconds.
+            "dur": elapsed * 1_000_000,
+            "pid": os.getpid(),
+            "tid": 0,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def write(self) -> None:
+        if self.path is None:
+            return
+        events = self.events
+        if self.dropped:
+            events = events + [{
+                "name": "trace truncated",
+                "ph": "i",
+                "s": "g",   # Drawn across the whole timeline.
+                "ts": (self.first_dropped - self.origin) * 1_000_000,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": {"dropped_events": self.dropped},
+            }]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace written to {self.path}.", file=sys.stderr)
+        if self.dropped:
+            print(f"{self.dropped} events were dropped, the trace is incomplete.", file=sys.stderr)
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        tracer.add(self.name, self.start, time.perf_counter() - self.start, self.args)
+
+
+class TurnProfiler:
+    """
+    Runs cProfile around the turns and renders of the next few turns,
+    then dumps the stats to a file and summarizes the top functions.
+    """
+
+    def __init__(self, top: int = 10):
+        self.profile: Optional[cProfile.Profile] = None
+        self.turns_remaining = 0
+        self.top = top
+
+    @property
+    def active(self) -> bool:
+        return self.profile is not None
+
+    def start(self, turns: int) -> None:
+        self.profile = cProfile.Profile()
+        self.turns_remaining = turns
+
+    def end_turn(self) -> Optional[Tuple[str, List[str]]]:
+        """
+        Count a finished turn. Once the last one is counted the capture stops and
+        this returns the stats filename and the summary lines, otherwise None.
+        """
+        if self.profile is None:
+            return None
+
+        self.turns_remaining -= 1
+        if self.turns_remaining > 0:
+            return None
+
+        profile, self.profile = self.profile, None
+        profile.disable()
+
+        filename = time.strftime("profile_%Y%m%d_%H%M%S.prof")
+        profile.dump_stats(filename)
+
+        summary = self.summarize(profile)
+        print(f"Profile saved to {filename}.", file=sys.stderr)
+        print("\n".join(summary), file=sys.stderr)
+        return filename, summary
+
+    def summarize(self, profile: cProfile.Profile) -> List[str]:
+        """Return the top functions by cumulative time, one per line."""
+        profile_stats = pstats.Stats(profile, stream=io.StringIO())
+        profile_stats.sort_stats(pstats.SortKey.CUMULATIVE)
+
+        lines = []
+        for func in profile_stats.fcn_list[: self.top]:  # type: ignore
+            _, total_calls, _, cumulative_time, _ = profile_stats.stats[func]  # type: ignore
+            filename, line, name = func
+            location = f"{os.path.basename(filename)}:{line}" if line else filename
+            lines.append(
+                f"{cumulative_time * 1000:8.1f}ms {total_calls:>7} {name} ({location})"
+            )
+        return lines
+
+
+stats = FrameStats()
+tracer = Tracer()
+turn_profiler = TurnProfiler()
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """Record the enclosed block as a trace event, `args` are shown alongside it."""
+    if not tracer.enabled:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def measure(label: str, elapsed: float, allocated: int = 0) -> None:
+    """Record an already measured section, if the stats are being collected."""
+    if stats.enabled:
+        stats.record(label, elapsed, allocated)
+
+
+def timed(label: str) -> Callable[[F], F]:
+    """
+    Decorator that records the time spent in the wrapped function under `label`,
+    both in the overlay stats and in the trace.
+
+    Does nothing but call through while neither of them is enabled.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not (stats.enabled or tracer.enabled):
+                return func(*args, **kwargs)
+
+            # Allocations are only shown in the overlay, don't count them for the trace alone.
+            blocks = sys.getallocatedblocks() if stats.enabled else None
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if stats.enabled:
+                    allocated = sys.getallocatedblocks() - blocks if blocks is not None else 0
+                    stats.record(label, elapsed, allocated)
+                if tracer.enabled:
+                    tracer.add(label, start, elapsed)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator that records every call of the wrapped function in the trace only."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.add(name, start, time.perf_counter() - start)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def profiled(func: F) -> F:
+    """Decorator that runs the wrapped function under the turn profiler, while it's capturing."""
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        profile = turn_profiler.profile
+        if profile is None:
+            return func(*args, **kwargs)
+
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    return wrapper  # type: ignore
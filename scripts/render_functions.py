@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Iterable, Tuple
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple
 
 from collections import Counter
 
 import scripts.color
 import scripts.game_data
+import scripts.profiling as profiling
 
 if TYPE_CHECKING:
     from tcod import Console
@@ -18,9 +19,11 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
         return ""       
     names: Iterable = []
 
-    for entity in game_map.entities:
-        if entity.x == x and entity.y == y:
-            names.append(entity.name)
+    for entity in game_map.entities_at(x, y):
+        names.append(entity.name)
+
+    for name, count in game_map.remains_at(x, y).items():
+        names.extend([name] * count)
 
     names_counter = Counter(names)
 
@@ -63,13 +66,47 @@ def render_dungeon_level(
     console.print(x=x, y=y, string=engine.translation.translate("floor", dungeon_level=dungeon_level))
 
 
+# The key of the last tooltip and its text.
+_names_cache: Optional[Tuple[Tuple[GameMap, Tuple[int, int], int, int], str]] = None
+
+
 def render_names_at_mouse_location(
         console: Console, x: int, y: int, engine: Engine
 ) -> None:
-    mouse_x, mouse_y = engine.mouse_location
+    global _names_cache
+
+    game_map = engine.game_map
+    # The names only change when the mouse moves, an entity changes or the player's view changes.
+    key = (game_map, engine.mouse_location, game_map.entity_version, game_map.visible_version)
+    if _names_cache is None or _names_cache[0] != key:
+        mouse_x, mouse_y = engine.mouse_location
+        _names_cache = (key, get_names_at_location(x=mouse_x, y=mouse_y, game_map=game_map))
 
-    names_at_mouse_location = get_names_at_location(
-        x=mouse_x, y=mouse_y, game_map=engine.game_map
+    console.print(x=x, y=y, string=_names_cache[1])
+
+
+def render_frame_stats(console: Console, x: int, y: int) -> None:
+    """
+    Render the rolling timings collected by `scripts.profiling` as an overlay.
+    Times are in milliseconds, blocks is the mean of net allocated blocks per call.
+    """
+    lines = profiling.stats.lines()
+    header = f"{'ms':<16}{'p50':>7}{'p95':>7}{'p99':>7}{'blocks':>8}"
+
+    width = len(header) + 2
+    height = len(lines) + 3
+
+    console.draw_frame(
+        x=x,
+        y=y,
+        width=width,
+        height=height,
+        clear=True,
+        fg=scripts.color.lightgrey,
+        bg=scripts.color.console_bg,
+        decoration=scripts.game_data.BOX_DECORATION_DOUBLE,
     )
+    console.print(x=x + 1, y=y + 1, string=header, fg=scripts.color.lightgrey)
 
-    console.print(x=x, y=y, string=names_at_mouse_location)
\ No newline at end of file
+    for i, line in enumerate(lines):
+        console.print(x=x + 1, y=y + 2 + i, string=line)
@@ -0,0 +1,228 @@
+"""
+Record the player's actions of a seeded game and play them back headlessly.
+
+A replay is just the run seed plus one small entry per turn, so it's much smaller
+than a save, and re-simulating it reproduces the game exactly.
+
+Play one back from the game folder with:
+
+    python -m scripts.replay replay.rpl --seek 500
+"""
+from __future__ import annotations
+
+
+import argparse
+import json
+import lzma
+import sys
+import time
+from typing import Any, List, Optional, TYPE_CHECKING
+
+
+import scripts.actions as actions
+from scripts.exceptions import ReplayDesync
+from scripts.snapshot import Snapshot, SnapshotRing
+from scripts.state_hash import engine_hash
+
+
+if TYPE_CHECKING:
+    from scripts.engine import Engine
+
+
+# Version 2 hashes the entities with a sum instead of XOR, older hashes don't match.
+REPLAY_VERSION = 2
+
+# Level up choices, in the order LevelUpEventHandler shows them.
+LEVEL_UP_CHOICES = ("increase_max_hp", "increase_power", "increase_defense")
+
+Entry = List[Any]
+
+
+def encode_action(action: actions.Action) -> Entry:
+    """
+    Return the compact entry for a player action.
+    Items are referenced by their index in the player's inventory.
+    """
+    if isinstance(action, actions.BumpAction):
+        return ["b", action.dx, action.dy]
+    elif isinstance(action, actions.WaitAction):
+        return ["w"]
+    elif isinstance(action, actions.PickupAction):
+        return ["p"]
+    elif isinstance(action, actions.TakeStairsAction):
+        return ["s"]
+    elif isinstance(action, actions.DropItem):
+        return ["d", action.entity.inventory.items.index(action.item)]
+    elif isinstance(action, actions.ItemAction):
+        return ["u", action.entity.inventory.items.index(action.item), *action.target_xy]
+    elif isinstance(action, actions.EquipAction):
+        return ["e", action.entity.inventory.items.index(action.item)]
+    raise TypeError(f"Can't record {type(action).__name__}.")
+
+
+def decode_action(engine: Engine, entry: Entry) -> actions.Action:
+    """Return the player action an entry was recorded from."""
+    player = engine.player
+    kind = entry[0]
+    if kind == "b":
+        return actions.BumpAction(player, entry[1], entry[2])
+    elif kind == "w":
+        return actions.WaitAction(player)
+    elif kind == "p":
+        return actions.PickupAction(player)
+    elif kind == "s":
+        return actions.TakeStairsAction(player)
+    elif kind == "d":
+        return actions.DropItem(player, player.inventory.items[entry[1]])
+    elif kind == "u":
+        return actions.ItemAction(player, player.inventory.items[entry[1]], (entry[2], entry[3]))
+    elif kind == "e":
+        return actions.EquipAction(player, player.inventory.items[entry[1]])
+    raise ValueError(f"Unknown replay entry: {entry!r}")
+
+
+def turn_hash(engine: Engine) -> int:
+    """The state hash stored after every entry, truncated to keep replays small."""
+    return engine_hash(engine) & 0xFFFFFFFF
+
+
+class ReplayLog:
+    """
+    The seed of a game and every turn the player has taken in it,
+    along with the state hash after each of them.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        entries: Optional[List[Entry]] = None,
+        hashes: Optional[List[int]] = None,
+    ):
+        self.seed = seed
+        self.entries: List[Entry] = entries if entries is not None else []
+        self.hashes: List[int] = hashes if hashes is not None else []
+
+    def record(self, entry: Entry, engine: Engine) -> None:
+        self.entries.append(entry)
+        self.hashes.append(turn_hash(engine))
+
+    def record_level_up(self, choice: int, engine: Engine) -> None:
+        self.record(["l", choice], engine)
+
+    def save(self, filename: str) -> None:
+        """Save this replay as compressed JSON."""
+        data = {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "entries": self.entries,
+            "hashes": self.hashes,
+        }
+        with open(filename, "wb") as f:
+            f.write(lzma.compress(json.dumps(data, separators=(",", ":")).encode("utf-8")))
+
+
+def load_replay(filename: str) -> ReplayLog:
+    with open(filename, "rb") as f:
+        data = json.loads(lzma.decompress(f.read()))
+    if data["version"] != REPLAY_VERSION:
+        raise ValueError(f"Unsupported replay version: {data['version']}")
+    return ReplayLog(data["seed"], data["entries"], data.get("hashes"))
+
+
+class ReplayPlayer:
+    """
+    Re-simulates a replay headlessly. Every `snapshot_interval` entries the game
+    state is snapshotted, so seeking only re-simulates from the closest one.
+    The last `snapshot_capacity` snapshots are kept, plus the one of the start.
+
+    If `verify` is set the state hash is checked after every entry and
+    `ReplayDesync` is raised at the first one that doesn't match.
+    """
+
+    def __init__(
+        self,
+        replay: ReplayLog,
+        snapshot_interval: int = 100,
+        verify: bool = True,
+        snapshot_capacity: int = 64,
+    ):
+        from scripts.setup_game import new_game
+
+        self.replay = replay
+        self.verify = verify and len(replay.hashes) == len(replay.entries)
+        self.engine: Engine = new_game(replay.seed)
+        self.position = 0   # Index of the next entry to play.
+        self.snapshots = SnapshotRing(snapshot_capacity, snapshot_interval)
+        self.start = Snapshot(self.engine, 0)
+
+    def restore_snapshot(self, snapshot: Snapshot) -> None:
+        snapshot.restore(self.engine)
+        self.position = snapshot.key
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.replay.entries)
+
+    def step(self) -> None:
+        """Play the next entry."""
+        from scripts.input_handlers import MainGameEventHandler
+
+        entry = self.replay.entries[self.position]
+        if entry[0] == "l":
+            getattr(self.engine.player.level, LEVEL_UP_CHOICES[entry[1]])()
+        elif not MainGameEventHandler(self.engine).handle_action(decode_action(self.engine, entry)):
+            raise ReplayDesync(f"Entry {self.position} {entry!r} was impossible to perform.")
+
+        if self.verify and turn_hash(self.engine) != self.replay.hashes[self.position]:
+            raise ReplayDesync(f"State hash mismatch after entry {self.position} {entry!r}.")
+
+        self.position += 1
+        if self.position % self.snapshots.interval == 0:
+            latest = self.snapshots.latest()
+            # Replays are deterministic, so snapshots ahead of a seek stay valid.
+            if latest is None or self.position > latest.key:
+                self.snapshots.capture(self.engine, self.position)
+
+    def seek(self, position: int) -> None:
+        """Move to just before entry `position`, re-simulating from the closest snapshot."""
+        position = max(0, min(position, len(self.replay.entries)))
+        if position < self.position or position - self.position > self.snapshots.interval:
+            closest = self.snapshots.latest(at_most=position) or self.start
+            if closest.key > self.position or position < self.position:
+                self.restore_snapshot(closest)
+        while self.position < position:
+            self.step()
+
+    def play_to_end(self) -> None:
+        self.seek(len(self.replay.entries))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Play back a replay at full speed.")
+    parser.add_argument("replay", help="Replay file.")
+    parser.add_argument("--seek", type=int, metavar="TURN", help="Stop before this entry instead of at the end.")
+    parser.add_argument("--snapshot-interval", type=int, default=100)
+    parser.add_argument("--snapshot-capacity", type=int, default=64, help="Snapshots kept for seeking back.")
+    parser.add_argument("--no-verify", action="store_true", help="Don't check the state hash of every turn.")
+    args = parser.parse_args(argv)
+
+    replay = load_replay(args.replay)
+    start = time.perf_counter()
+    player = ReplayPlayer(
+        replay, args.snapshot_interval, verify=not args.no_verify, snapshot_capacity=args.snapshot_capacity
+    )
+    player.seek(len(replay.entries) if args.seek is None else args.seek)
+    elapsed = time.perf_counter() - start
+
+    engine = player.engine
+    print(f"Seed {replay.seed}, played {player.position}/{len(replay.entries)} entries in {elapsed:.2f}s.")
+    print(
+        f"Floor {engine.game_world.current_floor}, "
+        f"HP {engine.player.fighter.hp}/{engine.player.fighter.max_hp}, "
+        f"level {engine.player.level.current_level}."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
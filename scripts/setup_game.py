@@ -3,13 +3,13 @@ from __future__ import annotations
 
 
 import random
-import copy
 import lzma
 import pickle
 import traceback
 from typing import Optional, Tuple
 
 
+import numpy as np  # type: ignore
 import tcod
 import tcod.libtcodpy
 
@@ -20,17 +20,26 @@ from scripts.game_map import GameWorld
 from scripts.translation import Translation
 import scripts.entity_factories as entity_factories
 import scripts.input_handlers as input_handlers
+import scripts.profiling as profiling
 
 
 # Load the background image and remove the alpha channel.
 #background_image = tcod.image.load("resources/background_scaled.png")[:, :, :3]
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
+@profiling.traced("new_game")
+def new_game(seed: Optional[int] = None) -> Engine:
+    """Return a brand new game session as an Engine instance.
 
-    player = copy.deepcopy(entity_factories.player)
+    If a `seed` is given the random generators are seeded with it,
+    so the same seed always generates the same dungeon.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
 
-    engine = Engine(player=player)
+    player = entity_factories.player.clone()
+
+    engine = Engine(player=player, seed=seed)
 
     engine.game_world = GameWorld(
         engine=engine,
@@ -39,6 +48,7 @@ def new_game() -> Engine:
         room_max_size=game_data.room_max_size,
         map_width=game_data.map_width,
         map_height=game_data.map_height,
+        generator=game_data.dungeon_generator,
     )
 
     engine.game_world.generate_floor()
@@ -48,8 +58,8 @@ def new_game() -> Engine:
         engine.translation.translate("welcome_message"), color.welcome_text
     )
 
-    dagger = copy.deepcopy(entity_factories.dagger)
-    leather_armor = copy.deepcopy(entity_factories.leather_armor)
+    dagger = entity_factories.dagger.clone()
+    leather_armor = entity_factories.leather_armor.clone()
 
     dagger.parent = player.inventory
     leather_armor.parent = player.inventory
@@ -63,6 +73,7 @@ def new_game() -> Engine:
     return engine
 
 
+@profiling.traced("load")
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
     with open(filename, "rb") as f:
@@ -146,7 +157,8 @@ class MainMenu(input_handlers.BaseEventHandler):
                 traceback.print_exc()   # Print to stderr.
                 return input_handlers.PopupMessage(self, f"{self.translation.translate("failed_save_game")}:\n{exc}")
         elif event.sym == tcod.event.KeySym.n:
-            return input_handlers.MainGameEventHandler(new_game())
+            # Every new game gets a seed, so it can be replayed.
+            return input_handlers.MainGameEventHandler(new_game(seed=random.randrange(2**31)))
         
         return None
     
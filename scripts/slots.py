@@ -0,0 +1,30 @@
+"""
+Base class for the slotted game objects: entities, components and actions.
+
+They are created by the thousands, `__slots__` saves the per-instance `__dict__`
+and makes attribute access faster.
+"""
+from __future__ import annotations
+
+
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+class Slotted:
+    """
+    Gives slotted classes a `__setstate__` that also loads pickles made before they
+    had `__slots__`, whose state is a plain attribute dictionary.
+    Subclasses must keep declaring `__slots__`, or they get a `__dict__` back.
+    """
+
+    __slots__ = ()
+
+    def __setstate__(
+        self, state: Union[Dict[str, Any], Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]
+    ) -> None:
+        if isinstance(state, tuple):
+            # Newer pickles: (instance dictionary, slot values), either may be None.
+            instance_state, slot_state = state
+            state = {**(instance_state or {}), **(slot_state or {})}
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
@@ -0,0 +1,267 @@
+"""
+Structural snapshots of the mutable per-turn game state, kept in a bounded ring.
+
+Instead of pickling or deep copying the whole Engine, a snapshot only records the
+fields that change from turn to turn: the entity table, fighter and level stats,
+inventories, AI state, the visible/explored and decal arrays and the RNG states.
+Arrays whose version counter on the GameMap didn't change since the previous
+snapshot are shared with it, without comparing their contents, and the tiles are
+never copied since they don't change after a floor is generated.
+"""
+from __future__ import annotations
+
+
+import random
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+
+import numpy as np  # type: ignore
+
+from components.equipment import SLOTS
+from scripts.actor_table import ActorTable
+from scripts.entity import Actor
+
+
+if TYPE_CHECKING:
+    from components.ai import BaseAI
+    from scripts.engine import Engine
+    from scripts.entity import Entity
+    from scripts.game_map import GameMap
+
+
+def _fields(obj: Any) -> Dict[str, Any]:
+    """Return the instance attributes of an object, with or without `__slots__`."""
+    if hasattr(obj, "__dict__"):
+        return dict(vars(obj))
+    fields = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                fields[name] = getattr(obj, name)
+    return fields
+
+
+def _ai_state(ai: Optional[BaseAI]) -> Optional[Dict[str, Any]]:
+    """The AI attributes, lists are copied since AI like HostileEnemy pops its path."""
+    if ai is None:
+        return None
+    return {
+        name: list(value) if isinstance(value, list) else value
+        for name, value in _fields(ai).items()
+    }
+
+
+class Snapshot:
+    """The mutable state of an Engine at one point in time."""
+
+    def __init__(self, engine: Engine, key: int, previous: Optional[Snapshot] = None):
+        game_map = engine.game_map
+        player = engine.player
+
+        self.key = key
+        self.game_map = game_map
+        self.current_floor = engine.game_world.current_floor
+        self.amulet_picked = engine.amulet_picked
+        self.amulet_placed = game_map.amulet_placed
+        self.messages = len(engine.message_log.messages)
+        self.last_message_count = engine.message_log.messages[-1].count if self.messages else 0
+        self.replay_entries = len(engine.replay.entries) if engine.replay is not None else 0
+
+        self.entities: Tuple[Entity, ...] = tuple(game_map.entities)
+        # The row order decides ties in actor table queries, and the collection order
+        # which item is picked up first, so both are restored as they were.
+        self.actor_rows: Tuple[Actor, ...] = tuple(game_map.actor_table.actors)
+        self.collections: Tuple[Entity, ...] = (*game_map.actors, *game_map.items, *game_map.corpses)
+        self.records: List[Tuple[Any, ...]] = [
+            self.record_entity(entity) for entity in self.entities
+        ]
+        if player not in game_map.entities:
+            self.records.append(self.record_entity(player))
+        # Items in the player's inventory can be dropped back onto the map.
+        self.records.extend(self.record_entity(item) for item in player.inventory.items)
+
+        self.state_hash = (game_map.state_hash.entities, game_map.state_hash.tiles)
+        self.tiles = game_map.tiles     # Never copied, a floor's tiles don't change.
+
+        # Share the arrays with the previous snapshot when their version counter
+        # didn't change since, the counters only ever go up.
+        self.versions = (game_map.visible_version, game_map.explored_version, game_map.decal_version)
+        same_map = previous is not None and previous.game_map is game_map
+        if same_map and previous.versions[0] == self.versions[0]:
+            self.visible = previous.visible
+        else:
+            self.visible = game_map.visible.copy()
+        if same_map and previous.versions[1] == self.versions[1]:
+            self.explored = previous.explored
+        else:
+            self.explored = game_map.explored.copy()
+        if game_map.decals is None:
+            self.decals: Optional[np.ndarray] = None
+            self.decal_counts: Optional[Dict[Tuple[int, int], Dict[int, int]]] = None
+        elif same_map and previous.decals is not None and previous.versions[2] == self.versions[2]:
+            self.decals = previous.decals
+            self.decal_counts = previous.decal_counts
+        else:
+            self.decals = game_map.decals.copy()
+            self.decal_counts = (
+                {location: dict(counts) for location, counts in game_map.decal_counts.items()}
+                if game_map.decal_counts is not None
+                else None
+            )
+        # Decal names are only ever appended.
+        self.decal_names = len(game_map.decal_names) if game_map.decals is not None else 0
+
+        self.random_state = random.getstate()
+        self.numpy_state = np.random.get_state()
+
+    @staticmethod
+    def record_entity(entity: Entity) -> Tuple[Any, ...]:
+        record: Tuple[Any, ...] = (
+            entity,
+            getattr(entity, "parent", None),
+            entity.x,
+            entity.y,
+            entity.char,
+            entity.color,
+            entity.name,
+            entity.blocks_movement,
+            entity.render_order,
+        )
+        if isinstance(entity, Actor):
+            fighter = entity.fighter
+            level = entity.level
+            equipment = entity.equipment
+            record += (
+                entity.ai,
+                _ai_state(entity.ai),
+                (fighter.max_hp, fighter._hp, fighter.base_defense, fighter.base_power),
+                (level.current_level, level.current_xp),
+                list(entity.inventory.items),
+                tuple(getattr(equipment, slot) for slot in SLOTS.values()),
+            )
+        return record
+
+    def restore(self, engine: Engine) -> None:
+        """Put `engine` back in the state this snapshot was taken in."""
+        game_map: GameMap = self.game_map
+        engine.game_map = game_map
+        engine.game_world.current_floor = self.current_floor
+        engine.amulet_picked = self.amulet_picked
+        game_map.amulet_placed = self.amulet_placed
+
+        del engine.message_log.messages[self.messages:]
+        if self.messages:
+            engine.message_log.messages[-1].count = self.last_message_count
+        if engine.replay is not None:
+            del engine.replay.entries[self.replay_entries:]
+            del engine.replay.hashes[self.replay_entries:]
+
+        game_map.entities.clear()
+        game_map.entities.update(self.entities)
+        for record in self.records:
+            self.restore_entity(record)
+
+        game_map._actor_table = ActorTable(self.actor_rows)
+        game_map.rebuild_collections(self.collections)
+        game_map.invalidate_entity_index()
+        # New versions, the restored arrays differ from what the current ones had.
+        game_map.visible_version += 1
+        game_map.explored_version += 1
+        game_map.decal_version += 1
+        game_map.state_hash.entities, game_map.state_hash.tiles = self.state_hash
+        game_map.tiles = self.tiles
+        # Copy into the map's own arrays, the snapshot's must stay untouched.
+        game_map.visible[:] = self.visible
+        game_map.explored[:] = self.explored
+        if self.decals is None:
+            game_map.decals = None
+        else:
+            game_map.decals = self.decals.copy()
+            del game_map.decal_names[self.decal_names:]
+        if self.decal_counts is None:
+            game_map.decal_counts = None
+        else:
+            game_map.decal_counts = {location: dict(counts) for location, counts in self.decal_counts.items()}
+
+        random.setstate(self.random_state)
+        np.random.set_state(self.numpy_state)
+
+    @staticmethod
+    def restore_entity(record: Tuple[Any, ...]) -> None:
+        entity, parent = record[0], record[1]
+        if parent is not None:
+            entity.parent = parent
+        (
+            entity.x,
+            entity.y,
+            entity.char,
+            entity.color,
+            entity.name,
+            entity.blocks_movement,
+            entity.render_order,
+        ) = record[2:9]
+        if len(record) > 9:
+            ai, ai_state, fighter, level, items, equipment = record[9:]
+            entity.ai = ai
+            if ai is not None:
+                for name, value in ai_state.items():
+                    setattr(ai, name, list(value) if isinstance(value, list) else value)
+            (
+                entity.fighter.max_hp,
+                entity.fighter._hp,
+                entity.fighter.base_defense,
+                entity.fighter.base_power,
+            ) = fighter
+            entity.level.current_level, entity.level.current_xp = level
+            entity.inventory.items[:] = items
+            for slot, item in zip(SLOTS.values(), equipment):
+                setattr(entity.equipment, slot, item)
+            entity.equipment.invalidate_bonuses()
+            entity.fighter.invalidate_stats()
+
+
+class SnapshotRing:
+    """Keeps the last `capacity` snapshots, taken every `interval` turns."""
+
+    def __init__(self, capacity: int, interval: int):
+        self.capacity = capacity
+        self.interval = interval
+        self.snapshots: Deque[Snapshot] = deque(maxlen=capacity)
+        self.turns = 0
+
+    def capture(self, engine: Engine, key: int) -> Snapshot:
+        previous = self.snapshots[-1] if self.snapshots else None
+        snapshot = Snapshot(engine, key, previous)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def tick(self, engine: Engine) -> None:
+        """Count a finished turn, capturing a snapshot every `interval` turns."""
+        self.turns += 1
+        if self.turns % self.interval == 0:
+            self.capture(engine, self.turns)
+
+    def latest(self, at_most: Optional[int] = None) -> Optional[Snapshot]:
+        """Return the most recent snapshot whose key is at most `at_most`."""
+        for snapshot in reversed(self.snapshots):
+            if at_most is None or snapshot.key <= at_most:
+                return snapshot
+        return None
+
+    def discard_after(self, key: int) -> None:
+        """Forget the snapshots taken after `key`, like after rewinding to it."""
+        while self.snapshots and self.snapshots[-1].key > key:
+            self.snapshots.pop()
+
+    def rewind(self, engine: Engine) -> Optional[int]:
+        """
+        Restore the most recent snapshot and drop it, so rewinding again goes
+        further back. Returns the turn rewound to, or None if there's none left.
+        """
+        if not self.snapshots:
+            return None
+        snapshot = self.snapshots.pop()
+        snapshot.restore(engine)
+        self.turns = snapshot.key
+        return snapshot.key
@@ -0,0 +1,272 @@
+"""
+Soak test: play many seeds headlessly with a simple bot to find crashes and slow turns.
+
+Run it from the game folder, for example:
+
+    python -m scripts.soak --seeds 1000 --workers 8 --bot greedy --report soak_report.json
+    python -m scripts.soak --seeds 20 --bot greedy --verify-save 50
+"""
+from __future__ import annotations
+
+
+import argparse
+import functools
+import heapq
+import json
+import multiprocessing
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+import numpy as np  # type: ignore
+
+import scripts.environment as environment
+import scripts.input_handlers as input_handlers
+from scripts.engine import Engine
+from scripts.replay import ReplayPlayer
+from scripts.state_hash import engine_hash, full_hash
+
+
+Bot = Callable[[Engine, random.Random], int]
+
+
+def random_bot(engine: Engine, rng: random.Random) -> int:
+    """Pick any action, taking the stairs whenever standing on them."""
+    player = engine.player
+    if (player.x, player.y) == engine.game_map.downstairs_location:
+        return environment.TAKE_STAIRS
+    return rng.randrange(environment.NUM_ACTIONS)
+
+
+def greedy_bot(engine: Engine, rng: random.Random) -> int:
+    """
+    Attack the closest visible enemy, pick up items and head for the stairs once
+    they're known. Wander randomly otherwise.
+    """
+    player = engine.player
+    game_map = engine.game_map
+
+    if (player.x, player.y) == game_map.downstairs_location:
+        return environment.TAKE_STAIRS
+    if any(item.x == player.x and item.y == player.y for item in game_map.items):
+        return environment.PICKUP
+
+    enemies = [
+        actor for actor in game_map.actors
+        if actor is not player and game_map.visible[actor.x, actor.y]
+    ]
+    if enemies:
+        target = min(enemies, key=lambda actor: max(abs(actor.x - player.x), abs(actor.y - player.y)))
+        destination = (target.x, target.y)
+    elif game_map.explored[game_map.downstairs_location]:
+        destination = game_map.downstairs_location
+    else:
+        return rng.randrange(len(environment.DIRECTIONS))
+
+    # The player's AI component can already find paths.
+    path = player.ai.get_path_to(*destination) if player.ai else []
+    if not path:
+        return rng.randrange(len(environment.DIRECTIONS))
+    step = (path[0][0] - player.x, path[0][1] - player.y)
+    return environment.DIRECTIONS.index(step) if step in environment.DIRECTIONS else environment.WAIT
+
+
+BOTS: Dict[str, Bot] = {
+    "random": random_bot,
+    "greedy": greedy_bot,
+}
+
+
+def save_and_load(engine: Engine) -> Engine:
+    """Round trip an Engine through a save, reseeding the RNGs like a new process would have them."""
+    data = pickle.dumps(engine)
+    random.seed()
+    np.random.seed()
+    return pickle.loads(data)
+
+
+def run_seed(
+    seed: int,
+    bot_name: str,
+    max_turns: int,
+    slowest: int,
+    trace_memory: bool,
+    verify_hash: bool = False,
+    save_every: int = 0,
+) -> Dict[str, Any]:
+    """
+    Play one seed to the end and return its statistics.
+    With `verify_hash` the incremental state hash is checked against a full rehash every turn.
+    With `save_every` the game is saved and loaded back every that many steps, with
+    the RNGs reseeded in between like in a new process, and at the end its replay
+    must play back without a desync.
+    """
+    bot = BOTS[bot_name]
+    rng = random.Random(seed)
+    env = environment.DungeonEnv(max_turns=max_turns)
+
+    result: Dict[str, Any] = {
+        "seed": seed,
+        "turns": 0,
+        "outcome": "truncated",
+        "seconds": 0.0,
+        "peak_memory": None,
+        "slowest_turns": [],
+        "error": None,
+        "error_turn": None,
+    }
+    slowest_turns: List[Tuple[float, int]] = []
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    steps = 0
+    try:
+        env.reset(seed)
+        assert env.engine is not None
+        while True:
+            action = bot(env.engine, rng)
+            turn_start = time.perf_counter()
+            _, done, info = env.play(action)
+            elapsed = time.perf_counter() - turn_start
+            steps += 1
+
+            if verify_hash and engine_hash(env.engine) != full_hash(env.engine):
+                raise AssertionError("The incremental state hash diverged from the full hash.")
+            if save_every and steps % save_every == 0 and not done:
+                with env.use_rng_state():
+                    env.engine = save_and_load(env.engine)
+                env.handler = input_handlers.MainGameEventHandler(env.engine)
+
+            if len(slowest_turns) < slowest:
+                heapq.heappush(slowest_turns, (elapsed, info["turn"]))
+            else:
+                heapq.heappushpop(slowest_turns, (elapsed, info["turn"]))
+
+            if done:
+                if not env.engine.player.is_alive:
+                    result["outcome"] = "died"
+                elif env.engine.amulet_picked:
+                    result["outcome"] = "won"
+                break
+            if steps >= max_turns * 10:
+                break   # The bot is stuck bumping into walls.
+        if save_every and env.engine.replay is not None:
+            ReplayPlayer(env.engine.replay).play_to_end()
+    except Exception:
+        result["outcome"] = "error"
+        result["error"] = traceback.format_exc()
+        result["error_turn"] = env.turn + 1   # The turn that was being played.
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        result["turns"] = env.turn
+        if trace_memory:
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    result["floor"] = env.engine.game_world.current_floor if env.engine else 0
+    result["slowest_turns"] = [
+        {"seed": seed, "turn": turn, "ms": elapsed * 1000}
+        for elapsed, turn in sorted(slowest_turns, reverse=True)
+    ]
+    return result
+
+
+def aggregate(results: List[Dict[str, Any]], slowest: int) -> Dict[str, Any]:
+    """Combine the results of every seed into one report."""
+    total_turns = sum(result["turns"] for result in results)
+    total_seconds = sum(result["seconds"] for result in results)
+    outcomes: Dict[str, int] = {}
+    for result in results:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+
+    memory = [result["peak_memory"] for result in results if result["peak_memory"] is not None]
+    slowest_turns = heapq.nlargest(
+        slowest,
+        (turn for result in results for turn in result["slowest_turns"]),
+        key=lambda turn: turn["ms"],
+    )
+
+    return {
+        "seeds": len(results),
+        "outcomes": outcomes,
+        "turns": total_turns,
+        "turns_per_second": total_turns / total_seconds if total_seconds else 0.0,
+        "max_floor": max((result["floor"] for result in results), default=0),
+        "peak_memory_max": max(memory, default=None),
+        "peak_memory_mean": sum(memory) / len(memory) if memory else None,
+        "errors": [
+            {"seed": result["seed"], "turn": result["error_turn"], "traceback": result["error"]}
+            for result in results if result["error"]
+        ],
+        "slowest_turns": slowest_turns,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Seeds: {report['seeds']}  Outcomes: {report['outcomes']}")
+    print(f"Turns: {report['turns']}  ({report['turns_per_second']:.0f} turns/s per worker)")
+    print(f"Deepest floor: {report['max_floor']}")
+    if report["peak_memory_max"] is not None:
+        print(
+            f"Peak memory: {report['peak_memory_max'] / 1024:.0f} KiB max, "
+            f"{report['peak_memory_mean'] / 1024:.0f} KiB mean"
+        )
+    print("Slowest turns:")
+    for turn in report["slowest_turns"]:
+        print(f"  {turn['ms']:8.2f}ms  seed {turn['seed']} turn {turn['turn']}")
+    print(f"Errors: {len(report['errors'])}")
+    for error in report["errors"]:
+        print(f"--- seed {error['seed']} turn {error['turn']} ---", file=sys.stderr)
+        print(error["traceback"], file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Play many seeds with a bot to find crashes and slow turns.")
+    parser.add_argument("--seeds", type=int, default=100, help="Number of seeds to play.")
+    parser.add_argument("--start-seed", type=int, default=0, help="First seed.")
+    parser.add_argument("--turns", type=int, default=2000, help="Turn limit per seed.")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Worker processes.")
+    parser.add_argument("--bot", choices=sorted(BOTS), default="random")
+    parser.add_argument("--slowest", type=int, default=10, help="How many of the slowest turns to report.")
+    parser.add_argument("--no-memory", action="store_true", help="Don't trace peak memory, it slows the run down.")
+    parser.add_argument("--verify-hash", action="store_true", help="Check the incremental state hash every turn.")
+    parser.add_argument(
+        "--verify-save", type=int, default=0, metavar="STEPS",
+        help="Save and load the game every STEPS steps, then check its replay still plays back.",
+    )
+    parser.add_argument("--report", metavar="FILE", help="Also write the report as JSON to FILE.")
+    args = parser.parse_args(argv)
+
+    play = functools.partial(
+        run_seed,
+        bot_name=args.bot,
+        max_turns=args.turns,
+        slowest=args.slowest,
+        trace_memory=not args.no_memory,
+        verify_hash=args.verify_hash,
+        save_every=args.verify_save,
+    )
+    seeds = range(args.start_seed, args.start_seed + args.seeds)
+
+    with multiprocessing.Pool(args.workers) as pool:
+        results = list(pool.imap_unordered(play, seeds))
+    results.sort(key=lambda result: result["seed"])
+
+    report = aggregate(results, args.slowest)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
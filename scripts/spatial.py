@@ -0,0 +1,148 @@
+"""
+Vectorized spatial queries over the actors of a GameMap: disk, cone, line and
+nearest-visible.
+
+Shapes are precomputed once per size as boolean offset masks centered on the
+origin, each actor's offset to the origin is then looked up in the mask, so a
+query is a handful of NumPy operations over the whole actor table.
+"""
+from __future__ import annotations
+
+
+import functools
+import math
+from typing import List, Optional, TYPE_CHECKING
+
+
+import numpy as np  # type: ignore
+import tcod
+
+
+if TYPE_CHECKING:
+    from scripts.entity import Actor
+    from scripts.game_map import GameMap
+
+
+@functools.lru_cache(maxsize=None)
+def disk_mask(radius: int) -> np.ndarray:
+    """
+    The tiles at most `radius` away from the center, as a (2r+1, 2r+1) array
+    indexed by [dx + r, dy + r]. Shared, don't modify it.
+    """
+    offsets = np.arange(-radius, radius + 1)
+    mask = offsets[:, np.newaxis] ** 2 + offsets[np.newaxis, :] ** 2 <= radius * radius
+    mask.flags.writeable = False
+    return mask
+
+
+@functools.lru_cache(maxsize=256)
+def cone_mask(radius: int, dx: int, dy: int, half_angle: float) -> np.ndarray:
+    """
+    The tiles of the disk of `radius` that are within `half_angle` degrees of the
+    (dx, dy) direction, laid out like `disk_mask`. The center isn't included.
+    """
+    offsets = np.arange(-radius, radius + 1)
+    ox = offsets[:, np.newaxis]
+    oy = offsets[np.newaxis, :]
+    length = math.hypot(dx, dy)
+    # Cosine of the angle between each offset and the direction.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = (ox * dx + oy * dy) / (np.hypot(ox, oy) * length)
+    # The epsilon keeps offsets exactly on the edge, like the diagonals of a 45 degree cone.
+    mask = disk_mask(radius) & (cosine >= math.cos(math.radians(half_angle)) - 1e-9)
+    mask[radius, radius] = False
+    mask.flags.writeable = False
+    return mask
+
+
+def _in_mask(game_map: GameMap, x: int, y: int, mask: np.ndarray, visible: bool) -> np.ndarray:
+    """Which rows of the actor table are alive and on the tiles of `mask` centered on (x, y)."""
+    table = game_map.actor_table
+    radius = mask.shape[0] // 2
+    dx = table.x - x
+    dy = table.y - y
+    inside = table.alive & (np.abs(dx) <= radius) & (np.abs(dy) <= radius)
+    inside[inside] = mask[dx[inside] + radius, dy[inside] + radius]
+    if visible:
+        inside &= game_map.visible[table.x, table.y]
+    return inside
+
+
+def _actors(game_map: GameMap, rows: np.ndarray) -> List[Actor]:
+    actors = game_map.actor_table.actors
+    return [actors[row] for row in np.flatnonzero(rows)]
+
+
+def actors_in_disk(
+    game_map: GameMap, x: int, y: int, radius: int, visible: bool = False
+) -> List[Actor]:
+    """The living actors at most `radius` tiles away from (x, y), only visible ones if `visible`."""
+    return _actors(game_map, _in_mask(game_map, x, y, disk_mask(radius), visible))
+
+
+def actors_in_cone(
+    game_map: GameMap,
+    x: int,
+    y: int,
+    target_x: int,
+    target_y: int,
+    radius: int,
+    half_angle: float = 45.0,
+    visible: bool = False,
+) -> List[Actor]:
+    """The living actors in the cone from (x, y) towards the target, up to `radius` tiles away."""
+    if (target_x, target_y) == (x, y):
+        return []
+    mask = cone_mask(radius, target_x - x, target_y - y, half_angle)
+    return _actors(game_map, _in_mask(game_map, x, y, mask, visible))
+
+
+def line_tiles(game_map: GameMap, x: int, y: int, target_x: int, target_y: int) -> np.ndarray:
+    """
+    The (2, n) coordinates of the line from (x, y) to the target, without the
+    origin, stopping before the first tile that blocks sight.
+    """
+    path = tcod.los.bresenham((x, y), (target_x, target_y))[1:].T
+    blocked = np.flatnonzero(~game_map.tiles["transparent"][path[0], path[1]])
+    return path[:, :blocked[0]] if len(blocked) else path
+
+
+def actors_on_line(
+    game_map: GameMap, x: int, y: int, target_x: int, target_y: int, visible: bool = False
+) -> List[Actor]:
+    """The living actors on the line to the target, closest first."""
+    path = line_tiles(game_map, x, y, target_x, target_y)
+    table = game_map.actor_table
+    if not path.shape[1] or not len(table):
+        return []
+    # The step of the line each actor is on, or -1 if it's off the line.
+    steps = np.full(game_map.tiles.shape, -1, dtype=np.int32)
+    steps[path[0], path[1]] = np.arange(path.shape[1])
+    actor_steps = steps[table.x, table.y]
+    rows = table.alive & (actor_steps >= 0)
+    if visible:
+        rows &= game_map.visible[table.x, table.y]
+    found = np.flatnonzero(rows)
+    return [table.actors[row] for row in found[np.argsort(actor_steps[found], kind="stable")]]
+
+
+def nearest_visible_actor(
+    game_map: GameMap, x: int, y: int, closer_than: float, exclude: Optional[Actor] = None
+) -> Optional[Actor]:
+    """
+    The closest living, visible actor to (x, y) that is closer than `closer_than`,
+    other than `exclude`. Ties go to the earliest row of the actor table.
+    """
+    table = game_map.actor_table
+    candidates = table.alive & game_map.visible[table.x, table.y]
+    if exclude is not None and exclude in table:
+        candidates[table.rows[exclude]] = False
+    if not candidates.any():
+        return None
+    distance_squared = np.where(
+        candidates, (table.x - x) ** 2 + (table.y - y) ** 2, np.iinfo(np.int32).max
+    )
+    row = int(np.argmin(distance_squared))
+    if distance_squared[row] >= closer_than * closer_than:
+        return None
+    return table.actors[row]
@@ -0,0 +1,115 @@
+"""
+Cheap hashing of the game state, to detect when replays or parallel simulations diverge.
+
+The entity part is the sum, modulo 2**64, of one term per entity on the map, so
+it's updated incrementally: a change subtracts the entity's old term and adds
+its new one. Unlike XOR, a sum doesn't cancel out identical entities on the
+same tile, so a duplicated or lost pair of items changes the hash.
+`full_hash` recomputes everything from scratch, to verify the incremental one.
+
+The per-turn hash includes the state of the global random generators, so it's
+only meaningful for games that started from a seed, or that were loaded from a
+save that includes the RNG state (`Engine.__getstate__` stores it). A game
+loaded from an older save draws different numbers than the original run did,
+and loading it drops its replay.
+"""
+from __future__ import annotations
+
+
+import random
+import zlib
+from typing import TYPE_CHECKING
+
+
+import numpy as np  # type: ignore
+
+
+if TYPE_CHECKING:
+    from scripts.engine import Engine
+    from scripts.entity import Entity
+    from scripts.game_map import GameMap
+
+
+MASK = (1 << 64) - 1
+
+ACTOR_TAG = 1
+ITEM_TAG = 2
+
+
+def _splitmix64(value: int) -> int:
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+def mix(*values: int) -> int:
+    """Combine integers into a well distributed 64 bit hash."""
+    result = 0
+    for value in values:
+        result = _splitmix64(result ^ (value & MASK))
+    return result
+
+
+def entity_term(entity: Entity) -> int:
+    """The hash term of an entity: position plus HP for actors, position plus name for items."""
+    fighter = getattr(entity, "fighter", None)
+    if fighter is not None:
+        return mix(ACTOR_TAG, entity.x, entity.y, fighter.hp)
+    # Python's str hash changes between processes, crc32 doesn't.
+    return mix(ITEM_TAG, entity.x, entity.y, zlib.crc32(entity.name.encode("utf-8")))
+
+
+def tiles_hash(tiles: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(tiles).tobytes())
+
+
+def rng_hash() -> int:
+    """Hash the state of both global random generators the game uses, saves restore them."""
+    _, python_state, _ = random.getstate()
+    _, numpy_keys, numpy_pos, _, _ = np.random.get_state()
+    return mix(
+        zlib.crc32(np.array(python_state, dtype=np.uint32).tobytes()),
+        zlib.crc32(numpy_keys.tobytes()),
+        numpy_pos,
+    )
+
+
+class StateHash:
+    """The incrementally updated hash of a GameMap's entities and tiles."""
+
+    def __init__(self) -> None:
+        self.entities = 0
+        self.tiles = 0
+
+    @classmethod
+    def from_map(cls, game_map: GameMap) -> StateHash:
+        state_hash = cls()
+        for entity in game_map.entities:
+            state_hash.add(entity)
+        state_hash.update_tiles(game_map.tiles)
+        return state_hash
+
+    def add(self, entity: Entity) -> None:
+        """Add the current term of an entity."""
+        self.entities = (self.entities + entity_term(entity)) & MASK
+
+    def remove(self, entity: Entity) -> None:
+        """Subtract the current term of an entity, it must be the term that was added."""
+        self.entities = (self.entities - entity_term(entity)) & MASK
+
+    def update_tiles(self, tiles: np.ndarray) -> None:
+        """Rehash the tiles, they only change while a floor is generated."""
+        self.tiles = tiles_hash(tiles)
+
+
+def engine_hash(engine: Engine) -> int:
+    """The per-turn hash, using the incrementally updated entity and tile hashes."""
+    state_hash = engine.game_map.state_hash
+    return mix(engine.game_world.current_floor, state_hash.entities, state_hash.tiles, rng_hash())
+
+
+def full_hash(engine: Engine) -> int:
+    """Recompute `engine_hash` from scratch, it must always match the incremental one."""
+    state_hash = StateHash.from_map(engine.game_map)
+    return mix(engine.game_world.current_floor, state_hash.entities, state_hash.tiles, rng_hash())
@@ -16,6 +16,16 @@ graphic_dt = np.dtype(
     ]
 )
 
+# Decals left on a tile, like the remains of dead actors.
+decal_dt = np.dtype(
+    [
+        ("ch", np.int32),       # Unicode codepoint.
+        ("fg", "3B"),
+        ("name", np.int16),     # Index in GameMap.decal_names.
+        ("count", np.uint16),   # How many are stacked, 0 if there's no decal.
+    ]
+)
+
 # Tile struct used for statically defined tile data.
 tile_dt = np.dtype(
     [